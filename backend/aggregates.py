@@ -0,0 +1,434 @@
+import hashlib
+import json
+import logging
+import pickle
+import threading
+from collections import Counter, deque
+import pandas as pd
+from db import stream_rows
+from data_gen import bump_data_version, BOOT_ID
+from metrics import stage
+
+logger = logging.getLogger(__name__)
+
+MONTH_ORDER = ['January', 'February', 'March', 'April', 'May', 'June',
+               'July', 'August', 'September', 'October', 'November', 'December']
+MONTH_NUMBER = {month: number for number, month in enumerate(MONTH_ORDER, start=1)}
+
+# Records inserted by this process that have already been applied to the store;
+# their new_data notifications are consumed instead of being counted twice.
+PENDING_LIMIT = 10000
+
+
+class MonthlyAggregate:
+    """Running totals for one (hotel, country, year, month) cell."""
+    __slots__ = ("bookings", "cancellations", "revenue", "lead_time",
+                 "week_nights", "weekend_nights", "adr")
+
+    def __init__(self):
+        self.bookings = 0
+        self.cancellations = 0
+        self.revenue = 0.0
+        self.lead_time = 0
+        self.week_nights = 0
+        self.weekend_nights = 0
+        self.adr = 0.0
+
+
+class AggregateStore:
+    """
+    Materialized hotel x country x year x month cube of the hotel_bookings table.
+    Updated one booking at a time and read by the analytics charts and slices,
+    so query cost depends on the number of cells rather than the number of bookings.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._cells = {}
+        self._country_totals = Counter()
+        self._adr_values = {}
+        self._pending = deque(maxlen=PENDING_LIMIT)
+        # Increments applied while load() reads the table, replayed onto its result
+        self._journal = None
+        self._load_lock = threading.Lock()
+        self.loaded = False
+
+    def _cell(self, hotel, country, year, month):
+        key = (hotel, country, int(year), month)
+        cell = self._cells.get(key)
+        if cell is None:
+            cell = self._cells[key] = MonthlyAggregate()
+        return cell
+
+    def add_booking(self, record):
+        """
+        Apply a single booking record (a dict shaped like a table row). Every
+        field is converted before the cube is touched, so a malformed record
+        raises without leaving a partial update behind.
+        """
+        month = record["arrival_date_month"]
+        if isinstance(month, str):
+            month = MONTH_NUMBER[month]
+        year = int(record["arrival_date_year"])
+        canceled = int(record["is_canceled"])
+        lead_time = int(record["lead_time"])
+        week = int(record["stays_in_week_nights"])
+        weekend = int(record["stays_in_weekend_nights"])
+        adr = float(record["adr"])
+        revenue = record.get("revenue")
+        revenue = adr * (week + weekend) if revenue is None else float(revenue)
+        with self._lock:
+            country = record.get("country")
+            cell = self._cell(record["hotel"], country, year, month)
+            cell.bookings += 1
+            cell.cancellations += canceled
+            cell.revenue += revenue
+            cell.lead_time += lead_time
+            cell.week_nights += week
+            cell.weekend_nights += weekend
+            cell.adr += adr
+            if country is not None:
+                self._country_totals[country] += 1
+            self._adr_values.setdefault(record["hotel"], Counter())[round(adr, 2)] += 1
+            if self._journal is not None:
+                self._journal.append((self.add_booking, record))
+
+    def add_frame(self, df):
+        """Apply a DataFrame of booking rows with one groupby per aggregate."""
+        months = df["arrival_date_month"].map(MONTH_NUMBER)
+        grouped = df.assign(arrival_date_month=months, country=df["country"].where(df["country"].notna(), None)) \
+                    .groupby(["hotel", "country", "arrival_date_year", "arrival_date_month"], dropna=False) \
+                    .agg(bookings=("hotel", "size"), cancellations=("is_canceled", "sum"),
+                         revenue=("revenue", "sum"), lead_time=("lead_time", "sum"),
+                         week_nights=("stays_in_week_nights", "sum"),
+                         weekend_nights=("stays_in_weekend_nights", "sum"), adr=("adr", "sum"))
+        adr_counts = df.groupby(["hotel", df["adr"].round(2)]).size()
+        with self._lock:
+            for (hotel, country, year, month), row in zip(grouped.index, grouped.itertuples(index=False)):
+                country = None if pd.isna(country) else country
+                cell = self._cell(hotel, country, year, int(month))
+                cell.bookings += int(row.bookings)
+                cell.cancellations += int(row.cancellations)
+                cell.revenue += float(row.revenue)
+                cell.lead_time += int(row.lead_time)
+                cell.week_nights += int(row.week_nights)
+                cell.weekend_nights += int(row.weekend_nights)
+                cell.adr += float(row.adr)
+                if country is not None:
+                    self._country_totals[country] += int(row.bookings)
+            for (hotel, adr), count in adr_counts.items():
+                self._adr_values.setdefault(hotel, Counter())[float(adr)] += int(count)
+            if self._journal is not None:
+                self._journal.append((self.add_frame, df))
+
+    def expect_local_insert(self, record):
+        """
+        Remember a booking this process is about to insert, before the insert
+        commits, so its row notification is recognised whenever it arrives.
+        """
+        with self._lock:
+            self._pending.append(_fingerprint(record))
+
+    def cancel_local_insert(self, record):
+        """Forget a booking whose insert failed."""
+        with self._lock:
+            try:
+                self._pending.remove(_fingerprint(record))
+            except ValueError:
+                pass
+
+    def confirm_local_insert(self, record):
+        """
+        Apply a booking once its insert has committed. If the row notification
+        got here first it only consumed the fingerprint, so the booking is
+        counted exactly once either way.
+        """
+        self.add_booking(record)
+
+    def apply_notification(self, payload):
+        """
+        Apply a new_data notification. Row payloads (JSON objects) are applied
+        incrementally; anything else requires a full rebuild, signalled by
+        returning False.
+        """
+        try:
+            record = json.loads(payload)
+        except (TypeError, ValueError):
+            return False
+        if isinstance(record, dict) and record.get("source") == BOOT_ID:
+            return True  # a batch this process inserted and already applied
+        if not isinstance(record, dict) or "hotel" not in record:
+            return False
+        try:
+            fingerprint = _fingerprint(record)
+            with self._lock:
+                if fingerprint in self._pending:
+                    self._pending.remove(fingerprint)
+                    return True
+                self.add_booking(record)
+        except (KeyError, TypeError, ValueError, IndexError) as e:
+            logger.warning(f"Malformed row notification ({e!r}); falling back to a full rebuild")
+            return False
+        return True
+
+    def load(self, cell_rows, adr_rows):
+        """
+        Replace the store contents with GROUP BY results from the table. The
+        current cube keeps serving while the results are read, and increments
+        applied in the meantime are journaled and replayed onto the new cube
+        before it is swapped in, so none are lost.
+        """
+        with self._load_lock:
+            with self._lock:
+                self._journal = []
+            try:
+                cells, country_totals, adr_values = self._read_groups(cell_rows, adr_rows)
+            except BaseException:
+                with self._lock:
+                    self._journal = None
+                raise
+            with self._lock:
+                journal, self._journal = self._journal, None
+                self._cells = cells
+                self._country_totals = country_totals
+                self._adr_values = adr_values
+                for apply, increment in journal:
+                    apply(increment)
+                self.loaded = True
+
+    @staticmethod
+    def _read_groups(cell_rows, adr_rows):
+        cells = {}
+        country_totals = Counter()
+        for row in cell_rows:
+            key = (row.hotel, row.country, int(row.arrival_date_year), MONTH_NUMBER[row.arrival_date_month])
+            cell = cells.get(key)
+            if cell is None:
+                cell = cells[key] = MonthlyAggregate()
+            cell.bookings += int(row.bookings)
+            cell.cancellations += int(row.cancellations or 0)
+            cell.revenue += float(row.revenue or 0)
+            cell.lead_time += int(row.lead_time or 0)
+            cell.week_nights += int(row.week_nights or 0)
+            cell.weekend_nights += int(row.weekend_nights or 0)
+            cell.adr += float(row.adr or 0)
+            if row.country is not None:
+                country_totals[row.country] += int(row.bookings)
+        adr_values = {}
+        for row in adr_rows:
+            if row.adr is not None:
+                adr_values.setdefault(row.hotel, Counter())[round(float(row.adr), 2)] += int(row.bookings)
+        return cells, country_totals, adr_values
+
+    def content_hash(self):
+        """
+        Digest of the cube that does not depend on insertion order, so every
+        process holding the same bookings computes the same value.
+        """
+        with self._lock:
+            cells = [(repr(key), cell.bookings, cell.cancellations, cell.revenue, cell.lead_time,
+                      cell.week_nights, cell.weekend_nights, cell.adr) for key, cell in self._cells.items()]
+            adr_values = [(hotel, sorted(counts.items())) for hotel, counts in self._adr_values.items()]
+        digest = hashlib.sha1(repr((sorted(cells), sorted(adr_values))).encode("utf-8"))
+        return digest.hexdigest()[:20]
+
+    def snapshot(self):
+        """Serialized copy of the cube, published with the index for follower processes."""
+        with self._lock:
+            return pickle.dumps((self._cells, self._country_totals, self._adr_values),
+                                protocol=pickle.HIGHEST_PROTOCOL)
+
+    def restore(self, data):
+        """Replace the store contents with a snapshot taken by another process."""
+        cells, country_totals, adr_values = pickle.loads(data)
+        with self._lock:
+            self._cells = cells
+            self._country_totals = country_totals
+            self._adr_values = adr_values
+            self.loaded = True
+
+    def cell_count(self):
+        with self._lock:
+            return len(self._cells)
+
+    def cells(self, hotel=None, country=None, start=None, end=None):
+        """
+        Cube cells matching the filters. start and end are inclusive
+        (year, month) tuples; None leaves that side of the range open.
+        """
+        with self._lock:
+            items = list(self._cells.items())
+        selected = []
+        for (cell_hotel, cell_country, year, month), cell in items:
+            if hotel is not None and cell_hotel != hotel:
+                continue
+            if country is not None and cell_country != country:
+                continue
+            if start is not None and (year, month) < start:
+                continue
+            if end is not None and (year, month) > end:
+                continue
+            selected.append(((cell_hotel, cell_country, year, month), cell))
+        return selected
+
+    def monthly_series(self, **filters):
+        """Per (year, month) totals across the selected cells, sorted chronologically."""
+        totals = {}
+        for (_, _, year, month), cell in self.cells(**filters):
+            row = totals.setdefault((year, month), {
+                "year": year, "month": month, "bookings": 0, "cancellations": 0,
+                "revenue": 0.0, "lead_time": 0})
+            row["bookings"] += cell.bookings
+            row["cancellations"] += cell.cancellations
+            row["revenue"] += cell.revenue
+            row["lead_time"] += cell.lead_time
+        return [totals[key] for key in sorted(totals)]
+
+    def top_countries(self, n=10, **filters):
+        if not any(value is not None for value in filters.values()):
+            with self._lock:
+                return self._country_totals.most_common(n)
+        counts = Counter()
+        for (_, country, _, _), cell in self.cells(**filters):
+            if country is not None:
+                counts[country] += cell.bookings
+        return counts.most_common(n)
+
+    def hotel_summary(self, **filters):
+        """Per hotel booking count, stay night sums and ADR sum."""
+        summary = {}
+        for (hotel, _, _, _), cell in self.cells(**filters):
+            row = summary.setdefault(hotel, {
+                "hotel": hotel, "bookings": 0, "week_nights": 0,
+                "weekend_nights": 0, "adr": 0.0})
+            row["bookings"] += cell.bookings
+            row["week_nights"] += cell.week_nights
+            row["weekend_nights"] += cell.weekend_nights
+            row["adr"] += cell.adr
+        return [summary[hotel] for hotel in sorted(summary)]
+
+    def bookings_by_month(self, **filters):
+        """Booking counts per calendar month name, summed over all years."""
+        counts = Counter()
+        for (_, _, _, month), cell in self.cells(**filters):
+            counts[month] += cell.bookings
+        return [(name, counts.get(number, 0)) for number, name in enumerate(MONTH_ORDER, start=1)]
+
+    def adr_box_stats(self, max_outliers=0):
+        """
+        Box plot statistics (quartiles and 1.5 IQR whiskers) of ADR per hotel,
+        with up to max_outliers distinct values beyond the whiskers, evenly
+        spaced so the most extreme ones are always kept.
+        """
+        with self._lock:
+            histograms = {hotel: sorted(values.items()) for hotel, values in self._adr_values.items()}
+        stats = []
+        for hotel in sorted(histograms):
+            histogram = histograms[hotel]
+            n = sum(count for _, count in histogram)
+            if not n:
+                continue
+            q1 = _quantile(histogram, n, 0.25)
+            median = _quantile(histogram, n, 0.5)
+            q3 = _quantile(histogram, n, 0.75)
+            iqr = q3 - q1
+            low_limit, high_limit = q1 - 1.5 * iqr, q3 + 1.5 * iqr
+            inside = [value for value, _ in histogram if low_limit <= value <= high_limit]
+            outliers = [value for value, _ in histogram if value < low_limit or value > high_limit]
+            stats.append({
+                "hotel": hotel,
+                "q1": q1,
+                "median": median,
+                "q3": q3,
+                "lowerfence": inside[0] if inside else q1,
+                "upperfence": inside[-1] if inside else q3,
+                "mean": sum(value * count for value, count in histogram) / n,
+                "outliers": _spread_sample(outliers, max_outliers),
+            })
+        return stats
+
+
+def _fingerprint(record):
+    month = record["arrival_date_month"]
+    if not isinstance(month, str):
+        month = MONTH_ORDER[int(month) - 1]
+    return (record["hotel"], int(record["is_canceled"]), int(record["lead_time"]),
+            int(record["arrival_date_year"]), month, round(float(record["adr"]), 2),
+            int(record["stays_in_week_nights"]), int(record["stays_in_weekend_nights"]),
+            record.get("country"))
+
+
+def _spread_sample(values, k):
+    """Up to k evenly spaced items of a sorted list, always including both ends."""
+    if k <= 0 or not values:
+        return []
+    if len(values) <= k:
+        return list(values)
+    if k == 1:
+        return [values[-1]]
+    step = (len(values) - 1) / (k - 1)
+    return [values[round(i * step)] for i in range(k)]
+
+
+def _quantile(histogram, n, p):
+    """Linear-interpolated quantile of a sorted (value, count) histogram."""
+    position = p * (n - 1)
+    lower_index = int(position)
+    fraction = position - lower_index
+    lower = upper = None
+    seen = 0
+    for value, count in histogram:
+        seen += count
+        if lower is None and seen > lower_index:
+            lower = value
+        if seen > lower_index + 1 or (fraction == 0 and lower is not None):
+            upper = value
+            break
+    if upper is None:
+        upper = lower
+    return lower + (upper - lower) * fraction
+
+
+aggregate_store = AggregateStore()
+
+
+def parse_period(value):
+    """Parse a 'YYYY-MM' string into a (year, month) tuple."""
+    if value is None:
+        return None
+    year, _, month = value.partition("-")
+    period = (int(year), int(month))
+    if not 1 <= period[1] <= 12:
+        raise ValueError(f"Invalid month in period {value!r}")
+    return period
+
+
+CUBE_SQL = """
+    SELECT hotel, arrival_date_year, arrival_date_month, country,
+           COUNT(*) AS bookings,
+           SUM(is_canceled) AS cancellations,
+           SUM(revenue) AS revenue,
+           SUM(lead_time) AS lead_time,
+           SUM(stays_in_week_nights) AS week_nights,
+           SUM(stays_in_weekend_nights) AS weekend_nights,
+           SUM(adr) AS adr
+    FROM hotel_bookings
+    GROUP BY hotel, arrival_date_year, arrival_date_month, country
+"""
+ADR_HISTOGRAM_SQL = """
+    SELECT hotel, adr, COUNT(*) AS bookings
+    FROM hotel_bookings
+    GROUP BY hotel, adr
+"""
+
+
+def rebuild_aggregates():
+    """
+    Rebuild the aggregate store from the hotel_bookings table using GROUP BY
+    queries. Result rows are streamed into the store chunk by chunk, so memory
+    stays bounded however many distinct cells and ADR values the table has.
+    """
+    with stage("aggregate_rebuild", "sql_stream"):
+        aggregate_store.load(stream_rows(CUBE_SQL), stream_rows(ADR_HISTOGRAM_SQL))
+    bump_data_version()
+    logger.info(f"Aggregate store rebuilt with {aggregate_store.cell_count()} hotel/country/month cells.")
@@ -1,89 +1,242 @@
-from fastapi import APIRouter, HTTPException
+import hashlib
+import os
+import threading
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Request, Response
 import pandas as pd
-from datetime import datetime
-import plotly.express as px
 from fastapi.responses import JSONResponse
 import logging
-from data_gen import engine  # using shared engine from rag module
+from aggregates import aggregate_store, rebuild_aggregates, parse_period
+from data_gen import get_data_version
+from db import run_db
+from metrics import stage
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-@router.post("/analytics")
-async def generate_analytics():
+# ADR values beyond the whiskers to draw as points; 0 leaves them out.
+ADR_OUTLIER_SAMPLE = int(os.getenv("ADR_OUTLIER_SAMPLE", "50"))
+
+# Rendered (figure JSON, ETag) pairs keyed by data version, then chart name; only
+# the current version is kept and each chart is rendered the first time it is requested.
+_chart_cache = {}
+_chart_lock = threading.Lock()
+# (data version, cube hash) for the last version the hash was computed at
+_shared_version = (None, None)
+
+def shared_version():
+    """
+    Version of the analytics data that is the same in every worker holding the
+    same bookings: a hash of the cube, recomputed once per local data version.
+    """
+    global _shared_version
+    version = get_data_version()
+    computed_for, value = _shared_version
+    if computed_for != version:
+        value = aggregate_store.content_hash()
+        _shared_version = (version, value)
+    return value
+
+def chart_etag(version):
+    return f'"{version}"'
+
+def content_etag(body):
+    """ETag derived from the figure JSON, so a chart whose figures did not change keeps its tag."""
+    return f'"{hashlib.sha1(body.encode("utf-8")).hexdigest()[:20]}"'
+
+def etag_matches(request: Request, etag):
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    candidates = [tag[2:] if tag.startswith("W/") else tag for tag in candidates]
+    return "*" in candidates or etag in candidates
+
+def monthly_frame():
+    monthly_df = pd.DataFrame(aggregate_store.monthly_series())
+    monthly_df['date'] = pd.to_datetime(dict(year=monthly_df['year'], month=monthly_df['month'], day=1))
+    return monthly_df
+
+# Plotly is imported on the first chart render rather than at startup
+def revenue_trend_chart():
+    import plotly.express as px
+    revenue_df = monthly_frame().rename(columns={'revenue': 'total_revenue'})
+    return px.line(revenue_df, x='date', y='total_revenue', markers=True,
+                   title="Revenue Trends Over Time", labels={"date": "Date", "total_revenue": "Total Revenue (€)"})
+
+def cancellation_rate_chart():
+    import plotly.express as px
+    cancel_df = monthly_frame()
+    cancel_df['cancellation_rate'] = (cancel_df['cancellations'] / cancel_df['bookings']) * 100
+    return px.line(cancel_df, x='date', y='cancellation_rate', markers=True,
+                   title="Cancellation Rate Over Time", labels={"date": "Date", "cancellation_rate": "Cancellation Rate (%)"})
+
+def geographical_chart():
+    import plotly.express as px
+    geo_df = pd.DataFrame(aggregate_store.top_countries(10), columns=['country', 'bookings'])
+    return px.bar(geo_df, x='bookings', y='country', orientation='h',
+                  title="Top 10 Countries by Booking Count", labels={'bookings': 'Number of Bookings', 'country': 'Country Code'})
+
+def lead_time_chart():
+    import plotly.express as px
+    lead_df = monthly_frame()
+    lead_df['avg_lead_time'] = lead_df['lead_time'] / lead_df['bookings']
+    return px.line(lead_df, x='date', y='avg_lead_time', markers=True,
+                   title="Average Booking Lead Time Over Time", labels={'date': 'Date', 'avg_lead_time': 'Average Lead Time (Days)'})
+
+def adr_distribution_chart():
+    """Box plot drawn from precomputed quartiles and whiskers, with a bounded sample of outliers."""
+    import plotly.graph_objects as go
+    fig = go.Figure()
+    for stats in aggregate_store.adr_box_stats(ADR_OUTLIER_SAMPLE):
+        fig.add_trace(go.Box(name=stats['hotel'], x=[stats['hotel']],
+                             q1=[stats['q1']], median=[stats['median']], q3=[stats['q3']],
+                             lowerfence=[stats['lowerfence']], upperfence=[stats['upperfence']],
+                             mean=[stats['mean']]))
+        if stats['outliers']:
+            fig.add_trace(go.Scatter(x=[stats['hotel']] * len(stats['outliers']), y=stats['outliers'],
+                                     mode='markers', name=f"{stats['hotel']} outliers", showlegend=False,
+                                     marker={'size': 4, 'opacity': 0.6}))
+    fig.update_layout(title="ADR Distribution by Hotel Type", xaxis_title="Hotel Type",
+                      yaxis_title="Average Daily Rate (€)", legend_title_text="hotel")
+    return fig
+
+def stay_duration_chart():
+    import plotly.express as px
+    stay_df = pd.DataFrame(aggregate_store.hotel_summary())
+    stay_df['stays_in_week_nights'] = stay_df['week_nights'] / stay_df['bookings']
+    stay_df['stays_in_weekend_nights'] = stay_df['weekend_nights'] / stay_df['bookings']
+    return px.bar(stay_df, x='hotel', y=['stays_in_week_nights', 'stays_in_weekend_nights'],
+                  title="Average Stay Duration by Hotel Type",
+                  labels={'value': 'Average Nights', 'hotel': 'Hotel Type'}, barmode='stack')
+
+def monthly_trends_chart():
+    import plotly.express as px
+    monthly_bookings = pd.DataFrame(aggregate_store.bookings_by_month(), columns=['month', 'bookings'])
+    return px.bar(monthly_bookings, x='month', y='bookings',
+                  title="Monthly Booking Trends", labels={'month': 'Month', 'bookings': 'Number of Bookings'})
+
+CHART_BUILDERS = {
+    "revenue_trend": revenue_trend_chart,
+    "cancellation_rate": cancellation_rate_chart,
+    "geographical_dist": geographical_chart,
+    "lead_time_dist": lead_time_chart,
+    "adr_distribution": adr_distribution_chart,
+    "stay_duration": stay_duration_chart,
+    "monthly_trends": monthly_trends_chart,
+}
+
+def render_chart(name, version):
+    """(figure JSON, ETag) for one chart at the given data version, rendered at most once per version."""
+    with _chart_lock:
+        charts = _chart_cache.get(version)
+        if charts is None:
+            _chart_cache.clear()
+            charts = _chart_cache[version] = {}
+        if name not in charts:
+            with stage("analytics", f"render:{name}"):
+                body = CHART_BUILDERS[name]().to_json()
+                charts[name] = (body, content_etag(body))
+        return charts[name]
+
+def build_charts(version):
+    """All seven charts for the data version, or None if there is no data."""
+    if not aggregate_store.monthly_series():
+        return None
+    return {name: render_chart(name, version)[0] for name in CHART_BUILDERS}
+
+def ensure_loaded():
+    if not aggregate_store.loaded:
+        rebuild_aggregates()
+
+@router.api_route("/analytics", methods=["GET", "POST"])
+async def generate_analytics(request: Request):
     try:
-        df = pd.read_sql("SELECT * FROM hotel_bookings", con=engine)
-        if df.empty:
+        await run_db(ensure_loaded)
+        version = get_data_version()
+        etag = chart_etag(await run_db(shared_version))
+        if request.method == "GET" and etag_matches(request, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        # Plotly rendering is CPU-bound, so it runs off the event loop
+        payload = await run_db(build_charts, version)
+        if payload is None:
             return JSONResponse(content={"error": "No data found"}, status_code=404)
-        
-        # Revenue Trends Chart
-        revenue_df = df.groupby(['arrival_date_year', 'arrival_date_month'])['revenue'] \
-                      .sum().reset_index().rename(columns={'revenue': 'total_revenue'})
-        revenue_df['date'] = revenue_df.apply(
-            lambda x: datetime(x['arrival_date_year'],
-                               datetime.strptime(x['arrival_date_month'], '%B').month,
-                               1), axis=1)
-        revenue_df = revenue_df.sort_values('date')
-        fig1 = px.line(revenue_df, x='date', y='total_revenue', markers=True,
-                       title="Revenue Trends Over Time", labels={"date": "Date", "total_revenue": "Total Revenue (€)"})
-        
-        # Cancellation Rate Chart
-        cancel_df = df.groupby(['arrival_date_year', 'arrival_date_month']) \
-                      .agg(total_bookings=('is_canceled', 'count'),
-                           cancellations=('is_canceled', 'sum')).reset_index()
-        cancel_df['cancellation_rate'] = (cancel_df['cancellations'] / cancel_df['total_bookings']) * 100
-        cancel_df['date'] = cancel_df.apply(
-            lambda x: datetime(x['arrival_date_year'],
-                               datetime.strptime(x['arrival_date_month'], '%B').month,
-                               1), axis=1)
-        cancel_df = cancel_df.sort_values('date')
-        fig2 = px.line(cancel_df, x='date', y='cancellation_rate', markers=True,
-                       title="Cancellation Rate Over Time", labels={"date": "Date", "cancellation_rate": "Cancellation Rate (%)"})
-        
-        # Geographical Distribution Chart
-        country_dist = df['country'].value_counts().nlargest(10)
-        geo_df = pd.DataFrame({'country': country_dist.index, 'bookings': country_dist.values})
-        fig3 = px.bar(geo_df, x='bookings', y='country', orientation='h',
-                      title="Top 10 Countries by Booking Count", labels={'bookings': 'Number of Bookings', 'country': 'Country Code'})
-        
-        # Lead Time Chart
-        lead_df = df.groupby(['arrival_date_year', 'arrival_date_month'])['lead_time'] \
-                   .mean().reset_index().rename(columns={'lead_time': 'avg_lead_time'})
-        lead_df['date'] = lead_df.apply(
-            lambda x: datetime(x['arrival_date_year'],
-                               datetime.strptime(x['arrival_date_month'], '%B').month,
-                               1), axis=1)
-        lead_df = lead_df.sort_values('date')
-        fig4 = px.line(lead_df, x='date', y='avg_lead_time', markers=True,
-                       title="Average Booking Lead Time Over Time", labels={'date': 'Date', 'avg_lead_time': 'Average Lead Time (Days)'})
-        
-        # ADR Distribution Chart
-        fig5 = px.box(df, x='hotel', y='adr', title="ADR Distribution by Hotel Type",
-                      labels={'hotel': 'Hotel Type', 'adr': 'Average Daily Rate (€)'}, color='hotel')
-        
-        # Stay Duration Chart
-        df['total_stay'] = df['stays_in_week_nights'] + df['stays_in_weekend_nights']
-        stay_df = df.groupby('hotel')[['stays_in_week_nights', 'stays_in_weekend_nights']].mean().reset_index()
-        fig6 = px.bar(stay_df, x='hotel', y=['stays_in_week_nights', 'stays_in_weekend_nights'],
-                      title="Average Stay Duration by Hotel Type",
-                      labels={'value': 'Average Nights', 'hotel': 'Hotel Type'}, barmode='stack')
-        
-        # Monthly Booking Trends Chart
-        month_order = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October', 'November', 'December']
-        monthly_bookings = df.groupby('arrival_date_month').size().reindex(month_order, fill_value=0).reset_index()
-        monthly_bookings.columns = ['month', 'bookings']
-        fig7 = px.bar(monthly_bookings, x='month', y='bookings',
-                      title="Monthly Booking Trends", labels={'month': 'Month', 'bookings': 'Number of Bookings'})
-        
+        return JSONResponse(content=payload, headers={"ETag": etag})
+    except Exception as e:
+        logger.error(f"Error generating analytics: {e}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
+
+@router.get("/analytics/charts")
+async def list_charts():
+    """
+    Chart names and the current data version, cheap enough to poll. The version
+    is shared across workers, so polling a different worker does not look like
+    new data.
+    """
+    await run_db(ensure_loaded)
+    version = await run_db(shared_version)
+    return JSONResponse(content={"version": version, "charts": list(CHART_BUILDERS)},
+                        headers={"ETag": chart_etag(version), "Cache-Control": "no-cache"})
+
+@router.get("/analytics/charts/{name}")
+async def get_chart(name: str, request: Request):
+    """
+    One chart's Plotly figure JSON, served as-is from the per-version cache.
+    The ETag follows the figure content, so after new data arrives clients
+    only download the charts that actually changed.
+    """
+    if name not in CHART_BUILDERS:
+        raise HTTPException(status_code=404, detail=f"Unknown chart '{name}'")
+    try:
+        await run_db(ensure_loaded)
+        if not aggregate_store.monthly_series():
+            return JSONResponse(content={"error": "No data found"}, status_code=404)
+        body, etag = await run_db(render_chart, name, get_data_version())
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+    except Exception as e:
+        logger.error(f"Error rendering chart {name}: {e}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
+
+@router.get("/analytics/cube")
+async def analytics_cube(hotel: Optional[str] = None, country: Optional[str] = None,
+                         start: Optional[str] = None, end: Optional[str] = None, top: int = 10):
+    """Aggregates for a hotel/country/period slice, served from the precomputed cube."""
+    try:
+        filters = {"hotel": hotel, "country": country,
+                   "start": parse_period(start), "end": parse_period(end)}
+    except ValueError:
+        raise HTTPException(status_code=422, detail="start and end must be formatted as YYYY-MM")
+    try:
+        await run_db(ensure_loaded)
+        monthly = aggregate_store.monthly_series(**filters)
+        for row in monthly:
+            row["cancellation_rate"] = row["cancellations"] / row["bookings"] * 100
+            row["avg_lead_time"] = row["lead_time"] / row["bookings"]
+        hotels = aggregate_store.hotel_summary(**filters)
+        for row in hotels:
+            row["avg_adr"] = row["adr"] / row["bookings"]
+            row["avg_week_nights"] = row["week_nights"] / row["bookings"]
+            row["avg_weekend_nights"] = row["weekend_nights"] / row["bookings"]
+        countries = [{"country": code, "bookings": count}
+                     for code, count in aggregate_store.top_countries(top, **filters)]
         return {
-            "revenue_trend": fig1.to_json(),
-            "cancellation_rate": fig2.to_json(),
-            "geographical_dist": fig3.to_json(),
-            "lead_time_dist": fig4.to_json(),
-            "adr_distribution": fig5.to_json(),
-            "stay_duration": fig6.to_json(),
-            "monthly_trends": fig7.to_json()
+            "filters": {"hotel": hotel, "country": country, "start": start, "end": end},
+            "monthly": monthly,
+            "countries": countries,
+            "hotels": hotels
         }
     except Exception as e:
-        logger.error(f"Error generating analytics: {e}")
+        logger.error(f"Error querying analytics cube: {e}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
+
+@router.post("/analytics/rebuild")
+async def rebuild_analytics_store():
+    try:
+        await run_db(rebuild_aggregates)
+        return {"message": "Aggregate store rebuilt from hotel_bookings."}
+    except Exception as e:
+        logger.error(f"Error rebuilding aggregates: {e}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
@@ -0,0 +1,97 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# Maximum cached answers, and the cosine similarity above which a differently
+# worded question counts as the same question.
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "256"))
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+
+
+def normalize_question(question):
+    """Lower-case, collapse whitespace and drop surrounding punctuation."""
+    return re.sub(r"\s+", " ", question.lower()).strip(" \t?!.,;:")
+
+
+class AnswerCache:
+    """
+    LRU cache of answers keyed by normalized question text, with a fallback
+    match on query embeddings. Entries belong to one insights version and are
+    dropped as soon as a lookup or store sees a newer version.
+    """
+
+    def __init__(self, max_size=ANSWER_CACHE_SIZE, threshold=ANSWER_CACHE_SIMILARITY):
+        self.max_size = max_size
+        self.threshold = threshold
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def _sync_version(self, version):
+        """Advance to a newer version, dropping old entries; False for a stale version."""
+        if self._version is None or version > self._version:
+            self._entries.clear()
+            self._version = version
+        return version == self._version
+
+    def lookup(self, question, version):
+        """Exact match on the normalized question."""
+        key = normalize_question(question)
+        with self._lock:
+            entry = self._entries.get(key) if self._sync_version(version) else None
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            return entry[0]
+
+    def lookup_similar(self, vector, version):
+        """Best cached answer whose question embedding is within the similarity threshold."""
+        query = _unit(vector)
+        with self._lock:
+            candidates = []
+            if self._sync_version(version):
+                candidates = [(key, entry) for key, entry in self._entries.items() if entry[1] is not None]
+            if candidates:
+                similarities = np.stack([entry[1] for _, entry in candidates]) @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    key, entry = candidates[best]
+                    self._entries.move_to_end(key)
+                    self.semantic_hits += 1
+                    return entry[0]
+            self.misses += 1
+            return None
+
+    def store(self, question, version, answer, vector=None):
+        key = normalize_question(question)
+        with self._lock:
+            if not self._sync_version(version):
+                return
+            self._entries[key] = (answer, _unit(vector) if vector is not None else None)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+            }
+
+
+def _unit(vector):
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm else array
+
+
+answer_cache = AnswerCache()
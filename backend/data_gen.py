@@ -1,25 +1,40 @@
-import psycopg2
+import io
+import json
+import os
+import time
 import select
 import threading
+import numpy as np
 import pandas as pd
 import random
 import logging
+import uuid
+from functools import lru_cache
 from fastapi import APIRouter, HTTPException
-from sqlalchemy import create_engine
+from sqlalchemy import text
+from db import engine, run_db, listen_connection
+from rebuild_worker import rebuild_worker
+from metrics import stage, NOTIFICATIONS, DATA_VERSION
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-# Shared engine using the same DB_CONFIG from rag.py for consistency
-DB_CONFIG = {
-    "dbname": "hotel_db",
-    "user": "postgres",
-    "password": "admin",
-    "host": "localhost",
-    "port": "5432"
-}
-DATABASE_URL = f"postgresql://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['dbname']}"
-engine = create_engine(DATABASE_URL)
+# Monotonic data version, bumped whenever bookings change. BOOT_ID keeps versions
+# from different process lifetimes distinct when they are used as cache keys.
+BOOT_ID = uuid.uuid4().hex[:8]
+data_version = 0
+_version_lock = threading.Lock()
+
+def bump_data_version():
+    global data_version
+    with _version_lock:
+        data_version += 1
+        return data_version
+
+def get_data_version():
+    return data_version
+
+DATA_VERSION.set_function(get_data_version)
 
 @router.post("/generate-data")
 async def generate_new_data():
@@ -40,23 +55,227 @@ async def generate_new_data():
             "country": random.choice(["PRT", "GBR", "USA", "FRA", "ESP"])
         }
         new_record["revenue"] = new_record["adr"] * (new_record["stays_in_week_nights"] + new_record["stays_in_weekend_nights"])
-        pd.DataFrame([new_record]).to_sql("hotel_bookings", con=engine, if_exists="append", index=False)
+        from aggregates import aggregate_store  # keep monthly aggregates current without a rescan
+        aggregate_store.expect_local_insert(new_record)
+        try:
+            await run_db(pd.DataFrame([new_record]).to_sql, "hotel_bookings", con=engine, if_exists="append", index=False)
+        except Exception:
+            aggregate_store.cancel_local_insert(new_record)
+            raise
+        aggregate_store.confirm_local_insert(new_record)
+        bump_data_version()
         logger.info(f"Inserted new record: {new_record}")
         return {"message": "New data record generated successfully."}
     except Exception as e:
         logger.error(f"Error generating new data: {e}")
         raise HTTPException(status_code=500, detail="Failed to generate new data.")
 
+BOOKING_COLUMNS = ["hotel", "is_canceled", "lead_time", "arrival_date_year", "arrival_date_month",
+                   "adr", "stays_in_week_nights", "stays_in_weekend_nights", "country", "revenue"]
+INTEGER_COLUMNS = ["is_canceled", "lead_time", "arrival_date_year", "stays_in_week_nights", "stays_in_weekend_nights"]
+SAMPLE_DATASET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Datasets", "hotel_bookings_cleaned.csv")
+CATEGORICAL_COLUMNS = ["hotel", "is_canceled", "arrival_date_year", "arrival_date_month", "country"]
+BULK_CHUNK_SIZE = 50000
+BULK_MAX_ROWS = 10_000_000
+
+# Same ranges as the single-record generator above. Categorical columns are
+# {"values", "weights"}; numeric ones are uniform {"min", "max"} or empirical
+# {"quantiles"} (evenly spaced quantile points sampled by inverse transform).
+DEFAULT_DISTRIBUTIONS = {
+    "hotel": {"values": ["Resort Hotel", "City Hotel"]},
+    "is_canceled": {"values": [0, 1]},
+    "lead_time": {"min": 1, "max": 200},
+    "arrival_date_year": {"values": [2015, 2016, 2017]},
+    "arrival_date_month": {"values": ["January", "February", "March", "April", "May", "June",
+                                      "July", "August", "September", "October", "November", "December"]},
+    "adr": {"min": 50, "max": 300},
+    "stays_in_week_nights": {"min": 0, "max": 10},
+    "stays_in_weekend_nights": {"min": 0, "max": 5},
+    "country": {"values": ["PRT", "GBR", "USA", "FRA", "ESP"]}
+}
+
+@lru_cache(maxsize=1)
+def fit_distributions(path=SAMPLE_DATASET):
+    """Per-column marginal distributions fitted from a bookings CSV."""
+    df = pd.read_csv(path, usecols=list(DEFAULT_DISTRIBUTIONS))
+    distributions = {}
+    for column in CATEGORICAL_COLUMNS:
+        counts = df[column].value_counts()
+        distributions[column] = {"values": counts.index.tolist(), "weights": counts.values.tolist()}
+    for column in ["lead_time", "adr", "stays_in_week_nights", "stays_in_weekend_nights"]:
+        distributions[column] = {"quantiles": df[column].quantile(np.linspace(0, 1, 101)).tolist()}
+    return distributions
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def validate_distributions(distributions):
+    """Raises ValueError unless every column spec has one of the shapes sample_column accepts."""
+    for column, spec in distributions.items():
+        if column not in DEFAULT_DISTRIBUTIONS:
+            raise ValueError(f"Unknown column '{column}' in distributions")
+        if not isinstance(spec, dict):
+            raise ValueError(f"Distribution for '{column}' must be an object")
+        if "values" in spec:
+            values, weights = spec["values"], spec.get("weights")
+            if not isinstance(values, list) or not values:
+                raise ValueError(f"'{column}' values must be a non-empty list")
+            if column == "arrival_date_month" and not all(value in DEFAULT_DISTRIBUTIONS[column]["values"]
+                                                          for value in values):
+                raise ValueError("arrival_date_month values must be month names")
+            if column in INTEGER_COLUMNS + ["adr"] and not all(_is_number(value) for value in values):
+                raise ValueError(f"'{column}' values must be numbers")
+            if weights is not None and (not isinstance(weights, list) or len(weights) != len(values)
+                                        or not all(_is_number(w) and w >= 0 for w in weights)
+                                        or not sum(weights) > 0):
+                raise ValueError(f"'{column}' weights must be non-negative numbers, one per value, not all zero")
+        elif "quantiles" in spec:
+            quantiles = spec["quantiles"]
+            if not isinstance(quantiles, list) or len(quantiles) < 2 or not all(_is_number(q) for q in quantiles):
+                raise ValueError(f"'{column}' quantiles must be a list of at least two numbers")
+        elif column in CATEGORICAL_COLUMNS:
+            raise ValueError(f"'{column}' needs a 'values' list")
+        elif not (_is_number(spec.get("min")) and _is_number(spec.get("max")) and spec["min"] <= spec["max"]):
+            raise ValueError(f"'{column}' needs 'values', 'quantiles' or numeric 'min' <= 'max'")
+
+def sample_column(rng, column, spec, n):
+    if "values" in spec:
+        values = np.asarray(spec["values"])
+        weights = np.asarray(spec.get("weights") or [1] * len(values), dtype=float)
+        return values[rng.choice(len(values), size=n, p=weights / weights.sum())]
+    if "quantiles" in spec:
+        quantiles = np.asarray(spec["quantiles"], dtype=float)
+        sample = np.interp(rng.random(n), np.linspace(0, 1, len(quantiles)), quantiles)
+        return np.rint(sample).astype(np.int64) if column in INTEGER_COLUMNS else sample.round(2)
+    if column in INTEGER_COLUMNS:
+        return rng.integers(int(spec["min"]), int(spec["max"]), size=n, endpoint=True)
+    return rng.uniform(spec["min"], spec["max"], n).round(2)
+
+def generate_bookings(rng, n, distributions):
+    """Generates n synthetic booking rows, one vectorized draw per column."""
+    df = pd.DataFrame({column: sample_column(rng, column, spec, n)
+                       for column, spec in distributions.items()})
+    df["revenue"] = df["adr"] * (df["stays_in_week_nights"] + df["stays_in_weekend_nights"])
+    return df[BOOKING_COLUMNS]
+
+def insert_bookings(connection, df):
+    """Bulk-inserts a DataFrame of bookings: COPY on PostgreSQL, executemany elsewhere."""
+    if connection.dialect.name == "postgresql":
+        buffer = io.StringIO()
+        df.to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+        cursor = connection.connection.cursor()
+        cursor.copy_expert(
+            f"COPY hotel_bookings ({', '.join(df.columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        cursor.close()
+    else:
+        columns = ", ".join(df.columns)
+        placeholders = ", ".join(f":{column}" for column in df.columns)
+        connection.execute(text(f"INSERT INTO hotel_bookings ({columns}) VALUES ({placeholders})"),
+                           df.astype(object).where(df.notna(), None).to_dict("records"))
+
+def suppress_row_triggers(connection):
+    """
+    Skips per-row NOTIFY triggers for the current transaction so a batch emits
+    one notification instead of one per row. Needs a superuser; without one
+    the row triggers keep firing and False is returned.
+    """
+    if connection.dialect.name != "postgresql":
+        return True
+    try:
+        with connection.begin_nested():
+            connection.exec_driver_sql("SET LOCAL session_replication_role = replica")
+        return True
+    except Exception as e:
+        logger.warning(f"Could not suppress row triggers for bulk insert: {e}")
+        return False
+
+def notify_bulk_insert(rows):
+    """Sends one coalesced new_data notification for a batch inserted by this process."""
+    if engine.dialect.name != "postgresql":
+        return
+    payload = json.dumps({"bulk_rows": rows, "source": BOOT_ID})
+    with engine.begin() as connection:
+        connection.execute(text("SELECT pg_notify('new_data', :payload)"), {"payload": payload})
+
+def bulk_generate(rows, seed=None, distributions="fitted", chunk_size=BULK_CHUNK_SIZE):
+    """
+    Generates and inserts rows synthetic bookings in chunks. distributions is
+    "default", "fitted" (from Datasets/hotel_bookings_cleaned.csv) or a dict of
+    per-column specs overriding the fitted ones.
+    """
+    from aggregates import aggregate_store
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be a positive integer")
+    if distributions == "default":
+        resolved = dict(DEFAULT_DISTRIBUTIONS)
+    elif distributions == "fitted":
+        resolved = dict(fit_distributions())
+    elif isinstance(distributions, dict):
+        resolved = {**fit_distributions(), **distributions}
+    else:
+        raise ValueError("distributions must be 'default', 'fitted' or a dict of column specs")
+    if isinstance(distributions, dict):
+        validate_distributions(distributions)
+    if seed is not None and not (isinstance(seed, int) and not isinstance(seed, bool) and seed >= 0):
+        raise ValueError("seed must be a non-negative integer")
+    rng = np.random.default_rng(seed)
+    started = time.perf_counter()
+    inserted = 0
+    while inserted < rows:
+        chunk = generate_bookings(rng, min(chunk_size, rows - inserted), resolved)
+        with engine.begin() as connection:
+            suppressed = suppress_row_triggers(connection)
+            insert_bookings(connection, chunk)
+        if suppressed:
+            aggregate_store.add_frame(chunk)
+        # otherwise every row sends its own notification and the listener applies it
+        inserted += len(chunk)
+    elapsed = time.perf_counter() - started
+    bump_data_version()
+    notify_bulk_insert(inserted)
+    return {"rows": inserted, "seconds": round(elapsed, 3),
+            "rows_per_second": round(inserted / elapsed, 1) if elapsed else None}
+
+@router.post("/generate-data/bulk")
+async def generate_bulk_data(request: dict):
+    try:
+        rows = int(request.get("rows", 0))
+        chunk_size = int(request.get("chunk_size", BULK_CHUNK_SIZE))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=422, detail="rows and chunk_size must be integers")
+    if not 0 < rows <= BULK_MAX_ROWS:
+        raise HTTPException(status_code=422, detail=f"rows must be between 1 and {BULK_MAX_ROWS}")
+    if chunk_size <= 0:
+        raise HTTPException(status_code=422, detail="chunk_size must be a positive integer")
+    try:
+        result = await run_db(
+            bulk_generate, rows, request.get("seed"), request.get("distributions", "fitted"), chunk_size)
+        logger.info(f"Bulk inserted {result['rows']} records at {result['rows_per_second']} rows/s")
+        return {"message": "Bulk data generated successfully.", **result}
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error generating bulk data: {e}")
+        raise HTTPException(status_code=500, detail="Failed to generate bulk data.")
+
+def handle_notification(payload):
+    """Applies one new_data notification; a failure only costs a full rebuild."""
+    from aggregates import aggregate_store
+    NOTIFICATIONS.inc()
+    try:
+        with stage("notification", "apply"):
+            applied = aggregate_store.apply_notification(payload)
+    except Exception as e:
+        logger.error(f"Could not apply notification {payload!r}: {e}")
+        applied = False
+    bump_data_version()
+    rebuild_worker.submit(full=not applied)  # coalesce bursts into one rebuild
+
 def listen_to_notifications():
     try:
-        conn = psycopg2.connect(
-            dbname=DB_CONFIG["dbname"],
-            user=DB_CONFIG["user"],
-            password=DB_CONFIG["password"],
-            host=DB_CONFIG["host"],
-            port=DB_CONFIG["port"]
-        )
-        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        conn = listen_connection()
+        conn.autocommit = True
         cur = conn.cursor()
         cur.execute("LISTEN new_data;")
         logger.info("Listening for new data notifications on channel 'new_data'...")
@@ -67,12 +286,12 @@ def listen_to_notifications():
             while conn.notifies:
                 notify = conn.notifies.pop(0)
                 logger.info("Received notification: " + notify.payload)
-                from rag import update_insights  # update insights on notification
-                update_insights()
+                handle_notification(notify.payload)
     except Exception as e:
         logger.error(f"Notification listener error: {e}")
 
 def start_notification_listener():
+    rebuild_worker.start()
     listener_thread = threading.Thread(target=listen_to_notifications, daemon=True)
     listener_thread.start()
     logger.info("Notification listener thread started.")
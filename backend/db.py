@@ -0,0 +1,108 @@
+import os
+import time
+import logging
+import threading
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from starlette.concurrency import run_in_threadpool
+from metrics import DB_POOL_CHECKED_OUT, DB_POOL_OVERFLOW
+
+logger = logging.getLogger(__name__)
+
+DB_CONFIG = {
+    "dbname": "hotel_db",
+    "user": "postgres",
+    "password": "admin",
+    "host": "localhost",
+    "port": "5432"
+}
+# DATABASE_URL may point elsewhere, e.g. a SQLite file for benchmarks
+DATABASE_URL = os.getenv("DATABASE_URL", f"postgresql://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['dbname']}")
+
+# Pool sizing: DB_POOL_SIZE connections are kept open, DB_MAX_OVERFLOW more may be
+# opened under load, and a checkout waits at most DB_POOL_TIMEOUT seconds.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# Rows fetched per round trip when streaming results through a server-side cursor.
+DB_STREAM_CHUNK_SIZE = int(os.getenv("DB_STREAM_CHUNK_SIZE", "10000"))
+# How long a health probe result is reused before the database is queried again.
+DB_HEALTH_TTL = float(os.getenv("DB_HEALTH_TTL", "5"))
+
+
+def build_engine(url=DATABASE_URL):
+    """Engine with the pool settings above; SQLite keeps SQLAlchemy's own pool choice."""
+    if make_url(url).get_backend_name() == "sqlite":
+        return create_engine(url)
+    return create_engine(url, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+                         pool_timeout=DB_POOL_TIMEOUT, pool_recycle=DB_POOL_RECYCLE,
+                         pool_pre_ping=True)
+
+
+engine = build_engine()
+
+
+async def run_db(fn, *args, **kwargs):
+    """Runs blocking database work in the threadpool so it never stalls the event loop."""
+    return await run_in_threadpool(fn, *args, **kwargs)
+
+
+def stream_query(sql, params=None, chunk_size=DB_STREAM_CHUNK_SIZE):
+    """
+    Yields the rows of a query in lists of at most chunk_size, read through a
+    server-side cursor so only one chunk is held in memory at a time.
+    """
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True, max_row_buffer=chunk_size) \
+                           .execute(text(sql), params or {})
+        for partition in result.partitions(chunk_size):
+            yield partition
+
+
+def stream_rows(sql, params=None, chunk_size=DB_STREAM_CHUNK_SIZE):
+    """Row-by-row view of stream_query."""
+    for partition in stream_query(sql, params, chunk_size):
+        yield from partition
+
+
+def listen_connection():
+    """
+    A raw DBAPI connection detached from the pool, for LISTEN. It stays open
+    for the life of the listener and does not count against the pool size.
+    """
+    connection = engine.raw_connection()
+    connection.detach()
+    # driver_connection is cleared by detach(); the DBAPI connection itself stays open
+    return connection.dbapi_connection
+
+
+def pool_stats():
+    pool = engine.pool
+    stats = {"class": type(pool).__name__}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        if hasattr(pool, name):
+            stats[name] = getattr(pool, name)()
+    return stats
+
+
+DB_POOL_CHECKED_OUT.set_function(lambda: pool_stats().get("checkedout", 0))
+DB_POOL_OVERFLOW.set_function(lambda: max(pool_stats().get("overflow", 0), 0))
+
+_health = {"checked_at": 0.0, "status": None}
+_health_lock = threading.Lock()
+
+
+def check_database():
+    """'Connected' or the connection error, cached for DB_HEALTH_TTL seconds."""
+    with _health_lock:
+        if time.monotonic() - _health["checked_at"] < DB_HEALTH_TTL:
+            return _health["status"]
+        try:
+            with engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+            status = "Connected"
+        except Exception as e:
+            status = f"Not Connected: {e}"
+        _health.update(checked_at=time.monotonic(), status=status)
+        return status
@@ -0,0 +1,161 @@
+import re
+import logging
+import threading
+from aggregates import aggregate_store, MONTH_ORDER
+from data_gen import get_data_version
+
+logger = logging.getLogger(__name__)
+
+MONTH_PATTERNS = [(number, re.compile(rf"\b{name[:3].lower()}(?:{name[3:].lower()}|\.)?\b"))
+                  for number, name in enumerate(MONTH_ORDER, start=1) if name != "May"]
+# "may" is only a month when it is clearly used as one
+MONTH_PATTERNS.insert(4, (5, re.compile(r"\b(?:in|of|during) may\b|\bmay,? 20\d{2}\b")))
+YEAR_PATTERN = re.compile(r"\b(20\d{2})\b")
+HOTEL_PATTERNS = [("Resort Hotel", re.compile(r"\bresort\b")), ("City Hotel", re.compile(r"\bcity\b"))]
+
+# Questions asking for reasoning rather than a figure go to the RAG chain
+OPEN_ENDED = re.compile(r"\b(why|how come|explain|reason|compare|comparison|predict|forecast|should|recommend|suggest|improve)\b")
+
+# Dimensions the fact table cannot slice by. A question using any of them would
+# otherwise be answered with a wider total, so it goes to the RAG chain instead.
+SUPERLATIVE = re.compile(r"\b(which|what (?:hotel|month|year)|highest|lowest|most|least|best|worst|top|peak|"
+                         r"busiest|quietest|max(?:imum)?|min(?:imum)?|largest|smallest|biggest|rank(?:ing|ed)?)\b")
+QUARTER = re.compile(r"\b(q[1-4]|quarters?|h[12]|half|semester|season|summer|winter|spring|autumn)\b")
+RELATIVE_PERIOD = re.compile(r"\b(last|this|next|previous|past|recent(?:ly)?|current|today|yesterday|ago|ytd|"
+                             r"year[- ]to[- ]date|so far|since|until|before|after|between|through|"
+                             r"per|each|every|trend|over time|breakdown)\b")
+COUNTRY_CODE = re.compile(r"\b(?!ADR\b)[A-Z]{2,3}\b")
+COUNTRY_NAMES = re.compile(r"\b(portugal|portuguese|spain|spanish|france|french|germany|german|italy|italian|"
+                           r"britain|british|england|english|uk|united kingdom|ireland|irish|usa|america|american|"
+                           r"brazil|brazilian|netherlands|dutch|belgium|switzerland|china|chinese)\b")
+ORIGIN = re.compile(r"\b(?:from|guests?|visitors?|travell?ers?)\s+(?:from\s+)?"
+                    r"(?!(?:the\s+)?(?:city|resort)\b)(?!20\d{2}\b)(?!(?:" +
+                    "|".join(name.lower() for name in MONTH_ORDER) + r")\b)[a-z]")
+
+METRIC_PATTERNS = [
+    ("top_countries", re.compile(r"\b(countr(y|ies)|nationalit(y|ies))\b")),
+    ("cancellation_rate", re.compile(r"\bcancel")),
+    ("lead_time", re.compile(r"\blead[ -]?time\b")),
+    ("adr", re.compile(r"\b(adr|average daily rate|daily rate)\b")),
+    ("stay", re.compile(r"\b(stay|stays|nights|length of stay)\b")),
+    ("revenue", re.compile(r"\b(revenue|income|earnings|sales)\b")),
+    ("bookings", re.compile(r"\b(bookings?|reservations?)\b")),
+]
+
+
+class FactTable:
+    """
+    Totals for every (hotel, year, month) combination, with None meaning "all",
+    derived from the aggregate cube once per data version so that each fast
+    path answer is a dictionary lookup.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._facts = {}
+
+    def facts(self):
+        version = get_data_version()
+        with self._lock:
+            if version != self._version or not self._facts:
+                self._facts = self._build()
+                self._version = version
+            return self._facts
+
+    @staticmethod
+    def _build():
+        facts = {}
+        for (hotel, _, year, month), cell in aggregate_store.cells():
+            for key in [(h, y, m) for h in (hotel, None) for y in (year, None) for m in (month, None)]:
+                totals = facts.setdefault(key, [0, 0, 0.0, 0, 0, 0, 0.0])
+                totals[0] += cell.bookings
+                totals[1] += cell.cancellations
+                totals[2] += cell.revenue
+                totals[3] += cell.lead_time
+                totals[4] += cell.week_nights
+                totals[5] += cell.weekend_nights
+                totals[6] += cell.adr
+        return facts
+
+
+fact_table = FactTable()
+
+
+def parse_question(question):
+    """
+    Extracts (metric, hotel, year, month) from a question, or None if it is
+    open-ended or constrained by something the fact table cannot slice by.
+    """
+    text = question.lower()
+    if OPEN_ENDED.search(text) or QUARTER.search(text) or RELATIVE_PERIOD.search(text):
+        return None
+    metric = next((name for name, pattern in METRIC_PATTERNS if pattern.search(text)), None)
+    if metric is None:
+        return None
+    # Rankings and origins are only answerable by the top-countries listing
+    if metric != "top_countries" and (SUPERLATIVE.search(text) or COUNTRY_CODE.search(question)
+                                      or COUNTRY_NAMES.search(text) or ORIGIN.search(text)):
+        return None
+    hotels = [name for name, pattern in HOTEL_PATTERNS if pattern.search(text)]
+    years = YEAR_PATTERN.findall(text)
+    months = [number for number, pattern in MONTH_PATTERNS if pattern.search(text)]
+    if len(hotels) > 1 or len(years) > 1 or len(months) > 1:
+        return None
+    return (metric,
+            hotels[0] if hotels else None,
+            int(years[0]) if years else None,
+            months[0] if months else None)
+
+
+def describe_scope(hotel, year, month):
+    period = " ".join(part for part in (MONTH_ORDER[month - 1] if month else None,
+                                         str(year) if year else None) if part)
+    scope = f" for {hotel}" if hotel else ""
+    return scope + (f" in {period}" if period else " across all bookings")
+
+
+def answer_from_aggregates(question):
+    """
+    Answers questions that map onto a precomputed aggregate (revenue,
+    cancellation rate, lead time, top countries, ADR mean, average stay,
+    booking counts) straight from the fact table. Returns None when the
+    question should go to the RAG chain instead.
+    """
+    if not aggregate_store.loaded:
+        return None
+    parsed = parse_question(question)
+    if parsed is None:
+        return None
+    metric, hotel, year, month = parsed
+    scope = describe_scope(hotel, year, month)
+
+    if metric == "top_countries":
+        if month and not year:
+            return None
+        start = end = None
+        if year:
+            start, end = ((year, month), (year, month)) if month else ((year, 1), (year, 12))
+        top = aggregate_store.top_countries(5, hotel=hotel, start=start, end=end)
+        if not top:
+            return f"There are no bookings recorded{scope}."
+        listing = ", ".join(f"{country} ({count} bookings)" for country, count in top)
+        return f"The top countries by booking count{scope} are {listing}."
+
+    totals = fact_table.facts().get((hotel, year, month))
+    if not totals or not totals[0]:
+        return f"There are no bookings recorded{scope}."
+    bookings, cancellations, revenue, lead_time, week_nights, weekend_nights, adr = totals
+    if metric == "revenue":
+        return f"Total revenue{scope} was €{revenue:,.2f}."
+    if metric == "cancellation_rate":
+        return (f"The cancellation rate{scope} was {cancellations / bookings * 100:.2f}% "
+                f"({cancellations} of {bookings} bookings).")
+    if metric == "lead_time":
+        return f"The average booking lead time{scope} was {lead_time / bookings:.2f} days."
+    if metric == "adr":
+        return f"The mean ADR{scope} was €{adr / bookings:.2f}."
+    if metric == "stay":
+        return (f"The average stay{scope} was {(week_nights + weekend_nights) / bookings:.2f} nights "
+                f"({week_nights / bookings:.2f} week nights, {weekend_nights / bookings:.2f} weekend nights).")
+    return f"There were {bookings} bookings{scope}."
@@ -1,7 +1,10 @@
 from fastapi import APIRouter
-from sqlalchemy import text
-from rag import  vector_store, qa_chain
-from data_gen import engine
+import rag
+from db import run_db, check_database, pool_stats
+from rebuild_worker import rebuild_worker
+from leader import leadership
+from answer_cache import answer_cache
+from memory import session_memory
 import logging
 
 router = APIRouter()
@@ -10,15 +13,15 @@ logger = logging.getLogger(__name__)
 @router.get("/health")
 async def health_check():
     health_status = {}
-    try:
-        with engine.connect() as connection:
-            connection.execute(text("SELECT 1"))
-        health_status["database"] = "Connected"
-    except Exception as e:
-        health_status["database"] = f"Not Connected: {e}"
+    health_status["database"] = await run_db(check_database)
     
-    health_status["vector_store"] = "initialized" if vector_store is not None else "not initialized"
-    health_status["qa_chain"] = "initialized" if qa_chain is not None else "not initialized"
+    health_status["vector_store"] = "initialized" if rag.vector_store is not None else "not initialized"
+    health_status["qa_chain"] = "initialized" if rag.qa_chain is not None else "not initialized"
     
     overall_status = "200 OK" if all(status in ["Connected", "initialized"] for status in health_status.values()) else "In Active ❌"
-    return {"status": "200 Ok ", "dependencies": health_status}
+    return {"status": "200 Ok ", "dependencies": health_status,
+            "worker": {**leadership.stats(), "index_version": rag.published_index_version},
+            "database_pool": pool_stats(),
+            "rebuild_queue": rebuild_worker.stats(),
+            "answer_cache": answer_cache.stats(),
+            "sessions": session_memory.stats()}
@@ -0,0 +1,154 @@
+"""
+Streams a bookings CSV (e.g. Datasets/hotel_bookings_cleaned.csv) into the
+hotel_bookings table in bounded-memory chunks.
+
+    python ingest.py ../Datasets/hotel_bookings_cleaned.csv --chunk-size 100000
+
+Progress is committed together with each chunk, so an interrupted load picks up
+where it stopped when the same command is run again.
+"""
+import argparse
+import logging
+import os
+import time
+import pandas as pd
+from sqlalchemy import text
+from aggregates import MONTH_NUMBER
+from db import engine
+from data_gen import insert_bookings, suppress_row_triggers, notify_bulk_insert, BOOKING_COLUMNS, INTEGER_COLUMNS
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+INGEST_CHUNK_SIZE = 100000
+
+REQUIRED_COLUMNS = ["hotel", "is_canceled", "lead_time", "arrival_date_year", "arrival_date_month",
+                    "adr", "stays_in_week_nights", "stays_in_weekend_nights"]
+CSV_DTYPES = {"hotel": str, "arrival_date_month": str, "country": str}
+
+CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS hotel_bookings (
+    hotel TEXT NOT NULL,
+    is_canceled INTEGER NOT NULL,
+    lead_time INTEGER NOT NULL,
+    arrival_date_year INTEGER NOT NULL,
+    arrival_date_month TEXT NOT NULL,
+    adr DOUBLE PRECISION NOT NULL,
+    stays_in_week_nights INTEGER NOT NULL,
+    stays_in_weekend_nights INTEGER NOT NULL,
+    country TEXT,
+    revenue DOUBLE PRECISION
+)
+"""
+CREATE_PROGRESS_SQL = """
+CREATE TABLE IF NOT EXISTS ingest_progress (
+    source TEXT PRIMARY KEY,
+    rows_read BIGINT NOT NULL,
+    rows_loaded BIGINT NOT NULL,
+    completed INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+
+def source_key(path):
+    """Identifies a source file by absolute path and size, so a changed file starts over."""
+    return f"{os.path.abspath(path)}:{os.path.getsize(path)}"
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def clean_chunk(chunk):
+    """
+    Validates and types one CSV chunk. Rows with missing or unparsable required
+    fields or unknown month names are dropped; revenue is computed when the
+    column is missing or empty. Returns (clean_df, rejected_count).
+    """
+    missing = [column for column in REQUIRED_COLUMNS if column not in chunk.columns]
+    if missing:
+        raise ValueError(f"CSV is missing required columns: {', '.join(missing)}")
+    for column in INTEGER_COLUMNS + ["adr"]:
+        chunk[column] = pd.to_numeric(chunk[column], errors="coerce")
+    if "country" not in chunk.columns:
+        chunk["country"] = pd.NA
+    valid = chunk[REQUIRED_COLUMNS].notna().all(axis=1) & chunk["arrival_date_month"].isin(list(MONTH_NUMBER))
+    clean = chunk.loc[valid].copy()
+    for column in INTEGER_COLUMNS:
+        clean[column] = clean[column].astype("int32")
+    computed_revenue = clean["adr"] * (clean["stays_in_week_nights"] + clean["stays_in_weekend_nights"])
+    if "revenue" in clean.columns:
+        clean["revenue"] = pd.to_numeric(clean["revenue"], errors="coerce").fillna(computed_revenue)
+    else:
+        clean["revenue"] = computed_revenue
+    return clean[BOOKING_COLUMNS], int((~valid).sum())
+
+
+def ingest_csv(path, chunk_size=INGEST_CHUNK_SIZE, restart=False):
+    """Loads a bookings CSV chunk by chunk, resuming from the last committed chunk."""
+    key = source_key(path)
+    with engine.begin() as connection:
+        connection.execute(text(CREATE_TABLE_SQL))
+        connection.execute(text(CREATE_PROGRESS_SQL))
+        if restart:
+            connection.execute(text("DELETE FROM ingest_progress WHERE source = :source"), {"source": key})
+        progress = connection.execute(
+            text("SELECT rows_read, rows_loaded, completed FROM ingest_progress WHERE source = :source"),
+            {"source": key}).fetchone()
+        if progress is None:
+            connection.execute(
+                text("INSERT INTO ingest_progress (source, rows_read, rows_loaded, completed) "
+                     "VALUES (:source, 0, 0, 0)"), {"source": key})
+    rows_read, rows_loaded, completed = progress if progress else (0, 0, 0)
+    if completed:
+        logger.info(f"{path} was already ingested ({rows_loaded} rows); use --restart to load it again.")
+        return {"rows_loaded": 0, "rows_rejected": 0, "seconds": 0.0, "rows_per_second": None,
+                "peak_rss_mb": peak_rss_mb()}
+    if rows_read:
+        logger.info(f"Resuming {path} after {rows_read} rows.")
+
+    started = time.perf_counter()
+    loaded = rejected = 0
+    reader = pd.read_csv(path, chunksize=chunk_size, dtype=CSV_DTYPES,
+                         skiprows=(lambda line: 0 < line <= rows_read) if rows_read else None)
+    for chunk in reader:
+        clean, chunk_rejected = clean_chunk(chunk)
+        with engine.begin() as connection:
+            suppress_row_triggers(connection)
+            if len(clean):
+                insert_bookings(connection, clean)
+            connection.execute(
+                text("UPDATE ingest_progress SET rows_read = rows_read + :read, "
+                     "rows_loaded = rows_loaded + :loaded WHERE source = :source"),
+                {"read": len(chunk), "loaded": len(clean), "source": key})
+        loaded += len(clean)
+        rejected += chunk_rejected
+        elapsed = time.perf_counter() - started
+        logger.info(f"Loaded {loaded} rows ({rejected} rejected), "
+                    f"{loaded / elapsed:.0f} rows/s, peak RSS {peak_rss_mb()} MB")
+
+    with engine.begin() as connection:
+        connection.execute(text("UPDATE ingest_progress SET completed = 1 WHERE source = :source"),
+                           {"source": key})
+    notify_bulk_insert(loaded)
+    elapsed = time.perf_counter() - started
+    return {"rows_loaded": loaded, "rows_rejected": rejected, "seconds": round(elapsed, 3),
+            "rows_per_second": round(loaded / elapsed, 1) if elapsed else None,
+            "peak_rss_mb": peak_rss_mb()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream a bookings CSV into the hotel_bookings table.")
+    parser.add_argument("path", help="CSV file, e.g. ../Datasets/hotel_bookings_cleaned.csv")
+    parser.add_argument("--chunk-size", type=int, default=INGEST_CHUNK_SIZE)
+    parser.add_argument("--restart", action="store_true", help="ignore saved progress and load the file again")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    result = ingest_csv(args.path, chunk_size=args.chunk_size, restart=args.restart)
+    logger.info(f"Ingest finished: {result}")
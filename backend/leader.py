@@ -0,0 +1,81 @@
+import os
+import time
+import logging
+import threading
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# All workers of one deployment must point at the same lock file.
+LEADER_LOCK_FILE = os.getenv("LEADER_LOCK_FILE", "rebuild_leader.lock")
+# How often followers look for a newly published index and try to take over leadership.
+INDEX_POLL_INTERVAL = float(os.getenv("INDEX_POLL_INTERVAL", "1.0"))
+
+
+class Leadership:
+    """
+    Elects one rebuild leader among the worker processes sharing a lock file.
+    The leader listens for new data, rebuilds and publishes the index; the
+    others follow the published index. The lock is an exclusive flock held for
+    the lifetime of the process, so it is released even if the leader crashes
+    and a follower takes over on its next poll.
+    """
+
+    def __init__(self, lock_path=LEADER_LOCK_FILE, poll_interval=INDEX_POLL_INTERVAL):
+        self.lock_path = lock_path
+        self.poll_interval = poll_interval
+        self.is_leader = False
+        self._lock_file = None
+        self._thread = None
+
+    def try_acquire(self):
+        """Take leadership if no other process holds it. Returns True for the leader."""
+        if self.is_leader:
+            return True
+        if fcntl is None:
+            # Without flock every worker rebuilds on its own, as a single process does
+            self.is_leader = True
+            return True
+        lock_file = open(self.lock_path, "a")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        self.is_leader = True
+        logger.info(f"Process {os.getpid()} is the rebuild leader.")
+        return True
+
+    def follow(self, on_poll, on_promoted):
+        """
+        Runs on_poll every poll interval in a background thread until this
+        process becomes the leader, then calls on_promoted once and stops.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._follow, args=(on_poll, on_promoted),
+                                        name="index-follower", daemon=True)
+        self._thread.start()
+        logger.info(f"Process {os.getpid()} follows the published index every {self.poll_interval}s.")
+
+    def _follow(self, on_poll, on_promoted):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                if self.try_acquire():
+                    on_promoted()
+                    return
+                on_poll()
+            except Exception as e:
+                logger.error(f"Index follower error: {e}")
+
+    def stats(self):
+        return {"role": "leader" if self.is_leader else "follower", "pid": os.getpid()}
+
+
+leadership = Leadership()
@@ -1,11 +1,16 @@
 import logging
-from fastapi import FastAPI
+import threading
+import time
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from analytics import router as analytics_router
 from rag import router as rag_router
 from data_gen import router as data_gen_router
 from health import router as health_router
 from data_gen import start_notification_listener
+from metrics import router as metrics_router, REQUEST_DURATION
+from leader import leadership
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -22,25 +27,69 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Chart figures are verbose JSON and compress well; streamed answers are left alone
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 # Include all routers
 app.include_router(analytics_router, prefix="/api")
 app.include_router(rag_router, prefix="/api")
 app.include_router(data_gen_router, prefix="/api")
 app.include_router(health_router, prefix="/api")
+app.include_router(metrics_router, prefix="/api")
+
+@app.middleware("http")
+async def record_request_timing(request: Request, call_next):
+    """Times every request into the request-duration histogram and a Server-Timing header."""
+    started = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - started
+    route = request.scope.get("route")
+    REQUEST_DURATION.labels(request.method, route.path if route else "unmatched", response.status_code).observe(elapsed)
+    response.headers["Server-Timing"] = f"app;dur={elapsed * 1000:.1f}"
+    return response
+
+def revalidate_insights():
+    """Brings the aggregates and insights up to date with the table."""
+    from aggregates import rebuild_aggregates
+    from rag import update_insights
+    rebuild_aggregates()
+    update_insights()
+
+def revalidate_in_background():
+    try:
+        revalidate_insights()
+        logger.info("✅ Published index revalidated against the table")
+    except Exception as e:
+        logger.error(f"🚨 Background revalidation failed: {str(e)}")
+
+def take_over_leadership():
+    """Called on a follower once the previous leader has gone away."""
+    logger.info("Taking over as rebuild leader...")
+    revalidate_insights()
+    start_notification_listener()
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize services on startup"""
     try:
         logger.info("Starting initialization sequence...")
-        # 1. Initialize RAG components
-        from rag import update_insights
-        update_insights()
+        from rag import load_published_index, refresh_published_index
+        # 1. Serve from the last published index when there is one
+        loaded = load_published_index()
         
-        # 2. Start database listener
-        start_notification_listener()
+        if leadership.try_acquire():
+            # 2. The leader revalidates against the table (before serving if nothing
+            #    was published yet) and is the only worker listening for new data
+            if loaded:
+                threading.Thread(target=revalidate_in_background, name="startup-revalidate", daemon=True).start()
+            else:
+                revalidate_insights()
+            start_notification_listener()
+        else:
+            # 2. Followers hot-swap to each index the leader publishes
+            leadership.follow(on_poll=refresh_published_index, on_promoted=take_over_leadership)
         
-        logger.info("✅ Backend services initialized successfully")
+        logger.info(f"✅ Backend services initialized successfully ({leadership.stats()['role']})")
     except Exception as e:
         logger.error(f"🚨 Startup failed: {str(e)}")
         raise RuntimeError(f"Startup failed: {str(e)}")
@@ -0,0 +1,126 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict, deque
+from metrics import SESSIONS, SESSION_HISTORY_TOKENS
+
+logger = logging.getLogger(__name__)
+
+# Per-session prompt budget for conversation history, number of sessions kept,
+# idle time after which a session is dropped, and whether turns that fall out
+# of the window are folded into a running summary instead of being discarded.
+SESSION_TOKEN_BUDGET = int(os.getenv("SESSION_TOKEN_BUDGET", "1024"))
+SESSION_MAX = int(os.getenv("SESSION_MAX", "1000"))
+SESSION_TTL = float(os.getenv("SESSION_TTL", "1800"))
+SESSION_SUMMARIZE = os.getenv("SESSION_SUMMARIZE", "0") == "1"
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (about four characters per token)."""
+    return max(1, len(text) // 4)
+
+
+def truncate_to_tokens(text, budget):
+    limit = budget * 4
+    return text if len(text) <= limit else text[-limit:]
+
+
+class Session:
+    __slots__ = ("turns", "tokens", "summary", "last_used")
+
+    def __init__(self):
+        self.turns = deque()
+        self.tokens = 0
+        self.summary = ""
+        self.last_used = time.monotonic()
+
+
+class SessionMemory:
+    """
+    Conversation history per client session. Each session keeps a sliding
+    window of turns within a token budget; sessions are evicted least recently
+    used first once SESSION_MAX is reached, and after SESSION_TTL seconds idle.
+    """
+
+    def __init__(self, token_budget=SESSION_TOKEN_BUDGET, max_sessions=SESSION_MAX,
+                 ttl=SESSION_TTL, summarize=SESSION_SUMMARIZE):
+        self.token_budget = token_budget
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.summarize = summarize
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        while self._sessions:
+            oldest_id, oldest = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_sessions and now - oldest.last_used < self.ttl:
+                break
+            del self._sessions[oldest_id]
+
+    def _session(self, session_id):
+        now = time.monotonic()
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = Session()
+        else:
+            self._sessions.move_to_end(session_id)
+        session.last_used = now
+        self._evict(now)
+        return session
+
+    def history_text(self, session_id):
+        """The session's history formatted for the prompt; empty without a session ID."""
+        if not session_id:
+            return ""
+        with self._lock:
+            session = self._session(session_id)
+            lines = [f"summary: {session.summary}"] if session.summary else []
+            lines.extend(f"{role}: {content}" for role, content, _ in session.turns)
+        return "\n".join(lines)
+
+    async def append(self, session_id, role, content, summarizer=None):
+        """
+        Add a turn and trim the window to the token budget. With summarization
+        enabled and a summarizer given, trimmed turns are folded into the
+        session summary by awaiting summarizer(previous_summary, trimmed_text).
+        """
+        if not session_id:
+            return
+        with self._lock:
+            session = self._session(session_id)
+            content = truncate_to_tokens(content, self.token_budget)
+            tokens = estimate_tokens(content)
+            session.turns.append((role, content, tokens))
+            session.tokens += tokens
+            trimmed = []
+            while session.tokens > self.token_budget and len(session.turns) > 1:
+                old_role, old_content, old_tokens = session.turns.popleft()
+                session.tokens -= old_tokens
+                trimmed.append(f"{old_role}: {old_content}")
+            previous_summary = session.summary
+        if not trimmed or not (self.summarize and summarizer):
+            return
+        try:
+            summary = await summarizer(previous_summary, "\n".join(trimmed))
+        except Exception as e:
+            logger.error(f"Summarizing session history failed: {e}")
+            return
+        with self._lock:
+            session.summary = truncate_to_tokens(summary.strip(), self.token_budget // 4)
+
+    def stats(self):
+        """Session count and history tokens, after dropping sessions past their TTL."""
+        with self._lock:
+            self._evict(time.monotonic())
+            return {
+                "sessions": len(self._sessions),
+                "history_tokens": sum(session.tokens for session in self._sessions.values()),
+            }
+
+
+session_memory = SessionMemory()
+
+SESSIONS.set_function(lambda: session_memory.stats()["sessions"])
+SESSION_HISTORY_TOKENS.set_function(lambda: session_memory.stats()["history_tokens"])
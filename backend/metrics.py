@@ -0,0 +1,74 @@
+import time
+import logging
+from contextlib import contextmanager
+from fastapi import APIRouter, Response
+from langchain_core.callbacks import BaseCallbackHandler
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+REQUEST_DURATION = Histogram("hotel_http_request_duration_seconds", "HTTP request latency",
+                             ["method", "route", "status"], buckets=LATENCY_BUCKETS)
+STAGE_DURATION = Histogram("hotel_stage_duration_seconds", "Time spent in each stage of an operation",
+                           ["operation", "stage"], buckets=LATENCY_BUCKETS)
+ANSWERS = Counter("hotel_ask_answers_total", "Answered questions by answering path", ["source"])
+NOTIFICATIONS = Counter("hotel_new_data_notifications_total", "new_data notifications received")
+INSIGHT_REBUILDS = Counter("hotel_insights_rebuilds_total", "Insight rebuilds that swapped in a new index")
+EMBEDDED_TEXTS = Counter("hotel_embedded_texts_total", "Insight texts sent to the embedding cache")
+INDEX_SIZE = Gauge("hotel_faiss_index_vectors", "Vectors in the serving FAISS index")
+LAST_REBUILD_DURATION = Gauge("hotel_insights_last_rebuild_seconds", "Duration of the last insight rebuild")
+NOTIFICATION_LAG = Histogram("hotel_notification_rebuild_lag_seconds",
+                             "Time from the first coalesced notification to the finished rebuild",
+                             buckets=LATENCY_BUCKETS)
+REBUILD_QUEUE_DEPTH = Gauge("hotel_rebuild_queue_depth", "Notifications waiting for the next rebuild")
+DATA_VERSION = Gauge("hotel_data_version", "Current booking data version")
+DB_POOL_CHECKED_OUT = Gauge("hotel_db_pool_checked_out", "Database connections currently checked out of the pool")
+DB_POOL_OVERFLOW = Gauge("hotel_db_pool_overflow", "Database connections open beyond the pool size")
+SESSIONS = Gauge("hotel_sessions", "Conversation sessions held in memory")
+SESSION_HISTORY_TOKENS = Gauge("hotel_session_history_tokens", "Estimated history tokens across all sessions")
+
+
+@contextmanager
+def stage(operation, name):
+    """Records the duration of a block as one stage of an operation."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_DURATION.labels(operation, name).observe(time.perf_counter() - started)
+
+
+class StageTimingHandler(BaseCallbackHandler):
+    """LangChain callback that splits a chain run into retrieval and LLM generation stages."""
+
+    def __init__(self, operation):
+        self.operation = operation
+        self._started = {}
+
+    def _start(self, run_id):
+        self._started[run_id] = time.perf_counter()
+
+    def _end(self, run_id, name):
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            STAGE_DURATION.labels(self.operation, name).observe(time.perf_counter() - started)
+
+    def on_retriever_start(self, serialized, query, *, run_id, **kwargs):
+        self._start(run_id)
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self._end(run_id, "retrieval")
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._end(run_id, "llm_generation")
+
+
+@router.get("/metrics")
+async def prometheus_metrics():
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -1,138 +1,495 @@
+import asyncio
+import json
 import logging
-import pandas as pd
-from datetime import datetime
+import os
+import pickle
+import shutil
+import threading
+import time
+from contextlib import asynccontextmanager
 from fastapi import APIRouter, HTTPException
-from langchain.chains import create_history_aware_retriever, create_retrieval_chain
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain.prompts import PromptTemplate
-from langchain_community.vectorstores import FAISS
-from langchain_ollama import OllamaEmbeddings, OllamaLLM
-from data_gen import engine
+from fastapi.responses import StreamingResponse
+from aggregates import aggregate_store, rebuild_aggregates, MONTH_ORDER
+from data_gen import bump_data_version
+from memory import session_memory
+from answer_cache import answer_cache
+from fast_path import answer_from_aggregates
+from metrics import stage, StageTimingHandler, ANSWERS, INSIGHT_REBUILDS, EMBEDDED_TEXTS, INDEX_SIZE, LAST_REBUILD_DURATION
+
+# LangChain, Ollama and FAISS are imported inside the functions that use them,
+# so the API can start serving before those modules have loaded.
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 
-conversation_history = []
-
 # Global variables for vector store and QA chain
 vector_store = None
 qa_chain = None
 
-def update_insights():
+# Insight texts currently in the vector store, keyed by stable insight ID,
+# and a version bumped each time a new store is swapped in
+current_insights = {}
+insights_version = 0
+
+EMBEDDING_MODEL = "nomic-embed-text:latest"
+EMBEDDING_CACHE_DIR = "embedding_cache"
+# FAISS_INDEX_DIR holds one directory per published index version and a
+# CURRENT file naming the live one; the rebuild leader is the only writer.
+FAISS_INDEX_DIR = "faiss_index"
+CURRENT_INDEX_FILE = "CURRENT"
+INDEX_METADATA_FILE = "insights.json"
+AGGREGATES_SNAPSHOT_FILE = "aggregates.pkl"
+INDEX_KEEP_VERSIONS = int(os.getenv("INDEX_KEEP_VERSIONS", "3"))
+published_index_version = 0
+# Hash of the aggregate cube in the published version, to skip republishing unchanged data
+published_cube_hash = None
+_embeddings = None
+_rebuild_lock = threading.Lock()
+
+LLM_MODEL = "phi4:latest"
+MAX_CONCURRENT_ASKS = int(os.getenv("MAX_CONCURRENT_ASKS", "4"))
+MAX_QUEUED_ASKS = int(os.getenv("MAX_QUEUED_ASKS", "32"))
+
+def build_embeddings():
+    """The embedding model; replace this to run against a local fake embedder."""
+    from langchain_ollama import OllamaEmbeddings
+    return OllamaEmbeddings(model=EMBEDDING_MODEL)
+
+def get_embeddings():
+    """Embeddings wrapped in an on-disk cache keyed by a hash of each text."""
+    global _embeddings
+    if _embeddings is None:
+        from langchain.embeddings import CacheBackedEmbeddings
+        from langchain.storage import LocalFileStore
+        _embeddings = CacheBackedEmbeddings.from_bytes_store(
+            build_embeddings(),
+            LocalFileStore(EMBEDDING_CACHE_DIR),
+            namespace=EMBEDDING_MODEL.replace(":", "_")  # LocalFileStore keys cannot contain ':'
+        )
+    return _embeddings
+
+def compute_insights():
+    """
+    Computes insight texts from the shared aggregate cube, keyed by stable
+    insight ID. The cube is the same process-wide structure the analytics
+    charts read, so no bookings are loaded or regrouped here.
+    """
+    if not aggregate_store.loaded:
+        rebuild_aggregates()
+    insights = {}
+    
+    # Revenue, Cancellation Rate and Booking Lead Time Insights (one pass over the months)
+    for row in aggregate_store.monthly_series():
+        year, month_abbr = row['year'], MONTH_ORDER[row['month'] - 1][:3]
+        key = f"{year}-{row['month']:02d}"
+        insights[f"revenue:{key}"] = f"Date: {month_abbr}1 {year} - Total revenue is {row['revenue']:.2f}."
+        insights[f"cancellation:{key}"] = f"On {month_abbr}1 {year}, cancellation rate was {row['cancellations'] / row['bookings'] * 100:.2f}%."
+        insights[f"lead_time:{key}"] = f"On {month_abbr}1 {year}, average lead time was {row['lead_time'] / row['bookings']:.2f} days."
+    
+    # Geographical Distribution Insight
+    for country, count in aggregate_store.top_countries(10):
+        insights[f"country:{country}"] = f"Country {country} had {count} bookings."
+    
+    # ADR Distribution and Average Stay Duration Insights (summary)
+    for row in aggregate_store.hotel_summary():
+        hotel, bookings = row['hotel'], row['bookings']
+        insights[f"adr:{hotel}"] = f"Hotel type {hotel} has ADR mean {row['adr'] / bookings:.2f}."
+        insights[f"stay:{hotel}"] = f"Hotel type {hotel} average stay is {(row['week_nights'] + row['weekend_nights']) / bookings:.2f} nights."
+    
+    # Monthly Booking Trends Insight
+    for month, count in aggregate_store.bookings_by_month():
+        insights[f"monthly:{month}"] = f"In {month}, total bookings was {count}."
+    return insights
+
+def copy_vector_store(store):
+    """Independent copy of a FAISS store, so it can be modified while the original serves queries."""
+    import faiss
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.vectorstores import FAISS
+    return FAISS(
+        embedding_function=store.embedding_function,
+        # clone_index would share the pages of a memory-mapped index, which cannot grow
+        index=faiss.deserialize_index(faiss.serialize_index(store.index)),
+        docstore=InMemoryDocstore(dict(store.docstore._dict)),
+        index_to_docstore_id=dict(store.index_to_docstore_id)
+    )
+
+def build_llm():
+    """The generation model; replace this to run the chain against a local fake LLM."""
+    from langchain_ollama import OllamaLLM
+    return OllamaLLM(model=LLM_MODEL)
+
+REPHRASE_TEMPLATE = """Given the conversation history and a follow-up question about hotel bookings,
+        rewrite the question so it can be understood without the history. Return only the question.
+        Conversation History:
+        {chat_history}
+        Follow-up Question:
+        {input}
+        Standalone Question:"""
+
+async def standalone_question(user_query, chat_history_str):
     """
-    Loads hotel booking data, computes insights, updates the FAISS vector store,
-    and rebuilds the retrieval-augmented QA chain.
+    The question rewritten so it no longer depends on the conversation. Answers
+    are cached under it, so a follow-up reuses the answer to the same question
+    asked in any session.
     """
-    global vector_store, qa_chain
+    if not chat_history_str:
+        return user_query
+    prompt = REPHRASE_TEMPLATE.format(chat_history=chat_history_str, input=user_query)
+    return (await build_llm().ainvoke(prompt)).strip() or user_query
+
+async def summarize_history(previous_summary, turns_text):
+    """Folds conversation turns that left the session window into a short summary."""
+    prompt = ("Summarize this hotel booking analytics conversation in at most three sentences, "
+              "keeping any figures that were discussed.\n"
+              f"Earlier summary: {previous_summary or 'none'}\n"
+              f"New turns:\n{turns_text}\nSummary:")
+    return await build_llm().ainvoke(prompt)
+
+def build_qa_chain(store):
+    """Builds the retrieval-augmented QA chain over the given vector store."""
+    from langchain.chains import create_history_aware_retriever, create_retrieval_chain
+    from langchain.chains.combine_documents import create_stuff_documents_chain
+    from langchain.prompts import PromptTemplate
+    llm = build_llm()
+    prompt_template = PromptTemplate(
+        template="""You're a Hotel Booking Assistant, who will answer the question with following conversation history and  context,
+        Answer the Question with the context, If you're facing a very non relevant question apart from knowledge , response with
+        "Sorry, Context is insufficient. Please try asking a different analytics question. I'm here to help."
+        Conversation History:
+        {chat_history}
+        Context:
+        {context}
+        Question:
+        {input}
+        Answer:""",
+        input_variables=["chat_history", "context", "input"]
+    )
+    # The retriever runs before any context exists, so it gets its own prompt that
+    # only turns a follow-up question into a standalone search query
+    rephrase_prompt = PromptTemplate(template=REPHRASE_TEMPLATE, input_variables=["chat_history", "input"])
+    retriever_chain = create_history_aware_retriever(llm, store.as_retriever(), rephrase_prompt)
+    document_chain = create_stuff_documents_chain(llm, prompt_template)
+    return create_retrieval_chain(retriever_chain, document_chain)
+
+def read_current_index():
+    """Version and directory of the currently published index, or (0, None)."""
     try:
-        logger.info("Updating insights based on latest data...")
-        df = pd.read_sql("SELECT * FROM hotel_bookings", con=engine)
-        if 'revenue' not in df.columns:
-            df['revenue'] = df['adr'] * (df['stays_in_week_nights'] + df['stays_in_weekend_nights'])
-        
-        # Revenue Trends Insight
-        revenue_df = df.groupby(['arrival_date_year', 'arrival_date_month'])['revenue'] \
-                       .sum().reset_index().rename(columns={'revenue': 'total_revenue'})
-        revenue_texts = []
-        for _, row in revenue_df.iterrows():
-            month_abbr = datetime.strptime(row['arrival_date_month'], '%B').strftime('%b')
-            revenue_texts.append(f"Date: {month_abbr}1 {int(row['arrival_date_year'])} - Total revenue is {row['total_revenue']:.2f}.")
-        
-        # Cancellation Rate Insight
-        cancel_df = df.groupby(['arrival_date_year', 'arrival_date_month']) \
-                      .agg(total_bookings=('is_canceled', 'count'),
-                           cancellations=('is_canceled', 'sum')).reset_index()
-        cancel_df['cancellation_rate'] = (cancel_df['cancellations'] / cancel_df['total_bookings']) * 100
-        cancel_texts = []
-        for _, row in cancel_df.iterrows():
-            month_abbr = datetime.strptime(row['arrival_date_month'], '%B').strftime('%b')
-            cancel_texts.append(f"On {month_abbr}1 {int(row['arrival_date_year'])}, cancellation rate was {row['cancellation_rate']:.2f}%.")
-        
-        # Geographical Distribution Insight
-        geo_series = df['country'].value_counts().nlargest(10)
-        geo_texts = [f"Country {country} had {count} bookings." for country, count in geo_series.items()]
-        
-        # Booking Lead Time Insight
-        lead_df = df.groupby(['arrival_date_year', 'arrival_date_month'])['lead_time'] \
-                    .mean().reset_index().rename(columns={'lead_time': 'avg_lead_time'})
-        lead_texts = []
-        for _, row in lead_df.iterrows():
-            month_abbr = datetime.strptime(row['arrival_date_month'], '%B').strftime('%b')
-            lead_texts.append(f"On {month_abbr}1 {int(row['arrival_date_year'])}, average lead time was {row['avg_lead_time']:.2f} days.")
-        
-        # ADR Distribution Insight (summary)
-        adr_df = df.groupby("hotel")['adr'].describe().reset_index()
-        adr_texts = [f"Hotel type {row['hotel']} has ADR mean {row['mean']:.2f}." for _, row in adr_df.iterrows()]
-        
-        # Average Stay Duration Insight
-        df['total_stay'] = df['stays_in_week_nights'] + df['stays_in_weekend_nights']
-        stay_df = df.groupby("hotel")['total_stay'].mean().reset_index().rename(columns={'total_stay': 'avg_stay'})
-        stay_texts = [f"Hotel type {row['hotel']} average stay is {row['avg_stay']:.2f} nights." for _, row in stay_df.iterrows()]
-        
-        # Monthly Booking Trends Insight
-        month_order = ['January', 'February', 'March', 'April', 'May', 'June', 
-                       'July', 'August', 'September', 'October', 'November', 'December']
-        monthly_bookings = df.groupby('arrival_date_month').size().reindex(month_order, fill_value=0)
-        monthly_texts = [f"In {month}, total bookings was {monthly_bookings.get(month, 0)}." for month in month_order]
-        
-        # Combine all insights
-        insight_texts = revenue_texts + cancel_texts + geo_texts + lead_texts + adr_texts + stay_texts + monthly_texts
-        logger.info(f"Generated {len(insight_texts)} insights.")
-        
-        # Update FAISS vector store with insights
-        embeddings = OllamaEmbeddings(model="nomic-embed-text:latest")
-        vector_store = FAISS.from_texts(
-            texts=insight_texts,
-            embedding=embeddings,
-            metadatas=[{"type": "insight"}] * len(insight_texts)
-        )
-        vector_store.save_local("faiss_index")
-        logger.info("FAISS vector store updated.")
-        
-        # Build the QA chain using an LLM
-        llm = OllamaLLM(model="phi4:latest")
-        prompt_template = PromptTemplate(
-            template="""You're a Hotel Booking Assistant, who will answer the question with following conversation history and  context,
-            Answer the Question with the context, If you're facing a very non relevant question apart from knowledge , response with
-            "Sorry, Context is insufficient. Please try asking a different analytics question. I'm here to help."
-            Conversation History:
-            {chat_history}
-            Context:
-            {context}
-            Question:
-            {input}
-            Answer:""",
-            input_variables=["chat_history", "context", "input"]
-        )
-        retriever_chain = create_history_aware_retriever(llm, vector_store.as_retriever(), prompt_template)
-        document_chain = create_stuff_documents_chain(llm, prompt_template)
-        qa_chain = create_retrieval_chain(retriever_chain, document_chain)
-        logger.info("QA chain updated.")
+        with open(os.path.join(FAISS_INDEX_DIR, CURRENT_INDEX_FILE)) as f:
+            name = f.read().strip()
+        return int(name.rsplit("-", 1)[1]), os.path.join(FAISS_INDEX_DIR, name)
+    except (OSError, ValueError, IndexError):
+        return 0, None
+
+def publish_index(store, insights):
+    """
+    Writes the FAISS store, the insight texts it holds and a snapshot of the
+    aggregate cube to a new versioned directory, then repoints CURRENT at it
+    with an atomic rename. Readers therefore only ever see complete versions.
+    Returns the published version.
+    """
+    global published_index_version, published_cube_hash
+    os.makedirs(FAISS_INDEX_DIR, exist_ok=True)
+    version = max(read_current_index()[0], published_index_version) + 1
+    name = f"index-{version:06d}"
+    staging_dir = os.path.join(FAISS_INDEX_DIR, name + ".tmp")
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    store.save_local(staging_dir)
+    cube_hash = aggregate_store.content_hash()
+    with open(os.path.join(staging_dir, AGGREGATES_SNAPSHOT_FILE), "wb") as f:
+        f.write(aggregate_store.snapshot())
+    metadata = {
+        "embedding_model": EMBEDDING_MODEL,
+        "saved_at": time.time(),
+        "bookings": sum(row["bookings"] for row in aggregate_store.hotel_summary()),
+        "insights": insights
+    }
+    with open(os.path.join(staging_dir, INDEX_METADATA_FILE), "w") as f:
+        json.dump(metadata, f)
+    os.rename(staging_dir, os.path.join(FAISS_INDEX_DIR, name))
+    current_path = os.path.join(FAISS_INDEX_DIR, CURRENT_INDEX_FILE)
+    with open(current_path + ".tmp", "w") as f:
+        f.write(name)
+    os.replace(current_path + ".tmp", current_path)
+    published_index_version = version
+    published_cube_hash = cube_hash
+    prune_index_versions(version)
+    return version
+
+def prune_index_versions(current_version):
+    """Removes published versions older than the last INDEX_KEEP_VERSIONS."""
+    for entry in os.listdir(FAISS_INDEX_DIR):
+        if not entry.startswith("index-") or entry.endswith(".tmp"):
+            continue
+        try:
+            version = int(entry.rsplit("-", 1)[1])
+        except ValueError:
+            continue
+        if version <= current_version - INDEX_KEEP_VERSIONS:
+            # Followers still mapping these files keep their pages until they swap
+            shutil.rmtree(os.path.join(FAISS_INDEX_DIR, entry), ignore_errors=True)
+
+def load_published_index():
+    """
+    Serves from the currently published index if it was built with the current
+    embedding model. The index file is memory-mapped, so workers share its
+    pages, and the aggregate cube is replaced with the snapshot published
+    alongside it, which keeps followers in step with the leader. Returns True
+    when a store and chain were swapped in.
+    """
+    global vector_store, qa_chain, current_insights, insights_version, published_index_version, published_cube_hash
+    version, index_dir = read_current_index()
+    if index_dir is None:
+        logger.info("No published FAISS index found.")
+        return False
+    try:
+        with open(os.path.join(index_dir, INDEX_METADATA_FILE)) as f:
+            metadata = json.load(f)
+        if metadata.get("embedding_model") != EMBEDDING_MODEL:
+            logger.info(f"Published FAISS index was built with {metadata.get('embedding_model')}; rebuilding it.")
+            return False
+        import faiss
+        from langchain_community.vectorstores import FAISS
+        index = faiss.read_index(os.path.join(index_dir, "index.faiss"),
+                                 faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+        with open(os.path.join(index_dir, "index.pkl"), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        store = FAISS(embedding_function=get_embeddings(), index=index, docstore=docstore,
+                      index_to_docstore_id=index_to_docstore_id)
+        chain = build_qa_chain(store)
+        with open(os.path.join(index_dir, AGGREGATES_SNAPSHOT_FILE), "rb") as f:
+            aggregate_store.restore(f.read())
+        bump_data_version()
+        with _rebuild_lock:
+            vector_store, qa_chain = store, chain
+            current_insights = metadata["insights"]
+            insights_version += 1
+            published_index_version = version
+            published_cube_hash = aggregate_store.content_hash()
+            INDEX_SIZE.set(store.index.ntotal)
+        logger.info(f"Loaded published FAISS index v{version} with {store.index.ntotal} insights "
+                    f"({metadata.get('bookings')} bookings, saved {time.ctime(metadata.get('saved_at', 0))}).")
+        return True
     except Exception as e:
-        logger.error(f"Error updating insights: {e}")
+        logger.error(f"Could not load published FAISS index v{version}: {e}")
+        return False
+
+def refresh_published_index():
+    """Hot-swaps to a newer published index; called periodically by followers."""
+    if read_current_index()[0] > published_index_version:
+        load_published_index()
+
+def update_insights():
+    """
+    Computes insights from the aggregate cube and applies only the added,
+    changed and removed insights to a copy of the FAISS vector store.
+    Embeddings come from a content-addressed on-disk cache, so unchanged texts
+    are never re-embedded. Queries keep using the previous store and chain
+    until the new pair is swapped in.
+    """
+    global vector_store, qa_chain, current_insights, insights_version
+    with _rebuild_lock:
+        try:
+            logger.info("Updating insights based on latest data...")
+            started = time.perf_counter()
+            with stage("update_insights", "compute_insights"):
+                insights = compute_insights()
+            logger.info(f"Generated {len(insights)} insights.")
+            
+            stale_ids = [insight_id for insight_id, text in current_insights.items()
+                         if insights.get(insight_id) != text]
+            new_ids = [insight_id for insight_id, text in insights.items()
+                       if current_insights.get(insight_id) != text]
+            if vector_store is not None and not stale_ids and not new_ids:
+                # Followers still need a refreshed aggregate cube, but nothing else
+                if aggregate_store.content_hash() != published_cube_hash:
+                    publish_index(vector_store, insights)
+                logger.info("Insights unchanged; FAISS vector store left as is.")
+                return
+            
+            embeddings = get_embeddings()
+            new_texts = [insights[insight_id] for insight_id in new_ids]
+            with stage("update_insights", "embed"):
+                vectors = embeddings.embed_documents(new_texts) if new_texts else []
+            EMBEDDED_TEXTS.inc(len(new_texts))
+            text_embeddings = list(zip(new_texts, vectors))
+            metadatas = [{"type": "insight", "insight_id": insight_id} for insight_id in new_ids]
+            from langchain_community.vectorstores import FAISS
+            with stage("update_insights", "index_update"):
+                if vector_store is None:
+                    new_store = FAISS.from_embeddings(text_embeddings, embeddings, metadatas=metadatas, ids=new_ids)
+                else:
+                    new_store = copy_vector_store(vector_store)
+                    if stale_ids:
+                        new_store.delete(stale_ids)
+                    if new_ids:
+                        new_store.add_embeddings(text_embeddings, metadatas=metadatas, ids=new_ids)
+            with stage("update_insights", "persist"):
+                publish_index(new_store, insights)
+            with stage("update_insights", "chain_build"):
+                new_chain = build_qa_chain(new_store)
+            
+            # Swap in the new store and chain; in-flight requests finish on the old chain.
+            vector_store, qa_chain = new_store, new_chain
+            current_insights = insights
+            insights_version += 1
+            INSIGHT_REBUILDS.inc()
+            INDEX_SIZE.set(new_store.index.ntotal)
+            LAST_REBUILD_DURATION.set(time.perf_counter() - started)
+            logger.info(f"FAISS vector store updated: {len(new_ids)} upserted, "
+                        f"{len(set(stale_ids) - set(new_ids))} removed.")
+        except Exception as e:
+            logger.error(f"Error updating insights: {e}")
+
+class AskLimiter:
+    """Caps concurrent LLM generations and the number of questions queued behind them."""
+
+    def __init__(self, max_concurrent, max_queued):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.waiting = 0
+        self.active = 0
+        self._semaphore = None
+
+    def check_capacity(self):
+        if self.waiting >= self.max_queued:
+            raise HTTPException(status_code=503, detail="Too many questions in progress, please retry shortly.")
+
+    async def acquire(self):
+        if self._semaphore is None:
+            # Created lazily so it binds to the server's running event loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+
+    def release(self):
+        self.active -= 1
+        self._semaphore.release()
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+ask_limiter = AskLimiter(MAX_CONCURRENT_ASKS, MAX_QUEUED_ASKS)
+
+async def lookup_cached_answer(user_query, version):
+    """
+    Cached answer for a question, matched first on normalized text and then on
+    query embedding. Returns (answer, query_vector); the vector is reused when
+    storing a fresh answer.
+    """
+    answer = answer_cache.lookup(user_query, version)
+    if answer is not None:
+        return answer, None
+    vector = await get_embeddings().aembed_query(user_query)
+    return answer_cache.lookup_similar(vector, version), vector
 
 @router.post("/ask")
 async def answer_question(question: dict):
     try:
-        if not qa_chain:
-            raise HTTPException(status_code=503, detail="Service not initialized")
         user_query = question.get("question", "")
-        conversation_history.append({"role": "user", "content": user_query})
-        chat_history_str = "\n".join([f"{msg['role']}: {msg['content']}" for msg in conversation_history])
+        session_id = question.get("session_id")
         
-        retrieved_docs = vector_store.similarity_search(user_query)
-        insights_text = "\n".join([doc.page_content for doc in retrieved_docs])
+        # Numeric questions about precomputed aggregates skip retrieval and the LLM
+        with stage("ask", "fast_path"):
+            answer = answer_from_aggregates(user_query)
+        if answer is not None:
+            await session_memory.append(session_id, "user", user_query, summarize_history)
+            await session_memory.append(session_id, "ai", answer, summarize_history)
+            ANSWERS.labels("fast_path").inc()
+            return {"answer": answer, "source": "fast_path"}
         
-        result = qa_chain.invoke({
-            "input": user_query,
-            "chat_history": chat_history_str,
-            "context": insights_text
-        })
-        conversation_history.append({"role": "ai", "content": result["answer"]})
-        return {"answer": result["answer"]}
+        chain = qa_chain
+        if not chain:
+            raise HTTPException(status_code=503, detail="Service not initialized")
+        ask_limiter.check_capacity()
+        chat_history_str = session_memory.history_text(session_id)
+        
+        # Follow-ups are rephrased first, then cached and answered as standalone questions
+        version = insights_version
+        if chat_history_str:
+            with stage("ask", "rephrase"):
+                async with ask_limiter.slot():
+                    query = await standalone_question(user_query, chat_history_str)
+        else:
+            query = user_query
+        with stage("ask", "cache_lookup"):
+            answer, query_vector = await lookup_cached_answer(query, version)
+        source = "cache"
+        if answer is None:
+            with stage("ask", "queue_wait"):
+                await ask_limiter.acquire()
+            try:
+                result = await chain.ainvoke({"input": query, "chat_history": ""},
+                                             config={"callbacks": [StageTimingHandler("ask")]})
+            finally:
+                ask_limiter.release()
+            answer, source = result["answer"], "rag"
+            answer_cache.store(query, version, answer, query_vector)
+        await session_memory.append(session_id, "user", user_query, summarize_history)
+        await session_memory.append(session_id, "ai", answer, summarize_history)
+        ANSWERS.labels(source).inc()
+        return {"answer": answer, "source": source}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Q&A error: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to process question: {e}")
 
-
+@router.post("/ask/stream")
+async def stream_answer(question: dict):
+    """Server-sent events variant of /ask that emits answer tokens as they are generated."""
+    user_query = question.get("question", "")
+    session_id = question.get("session_id")
+    fast_answer = answer_from_aggregates(user_query)
+    chain = qa_chain
+    if fast_answer is None and not chain:
+        raise HTTPException(status_code=503, detail="Service not initialized")
+    if fast_answer is None:
+        ask_limiter.check_capacity()
+    chat_history_str = session_memory.history_text(session_id)
+    version = insights_version
+    
+    async def event_stream():
+        answer_parts = []
+        try:
+            answer, source = fast_answer, "fast_path"
+            if answer is None:
+                query = user_query
+                if chat_history_str:
+                    async with ask_limiter.slot():
+                        query = await standalone_question(user_query, chat_history_str)
+                answer, query_vector = await lookup_cached_answer(query, version)
+                source = "cache"
+            if answer is not None:
+                yield f"data: {json.dumps({'token': answer})}\n\n"
+            else:
+                source = "rag"
+                async with ask_limiter.slot():
+                    async for chunk in chain.astream({"input": query, "chat_history": ""},
+                                                     config={"callbacks": [StageTimingHandler("ask_stream")]}):
+                        token = chunk.get("answer")
+                        if token:
+                            answer_parts.append(token)
+                            yield f"data: {json.dumps({'token': token})}\n\n"
+                answer = "".join(answer_parts)
+                answer_cache.store(query, version, answer, query_vector)
+            await session_memory.append(session_id, "user", user_query, summarize_history)
+            await session_memory.append(session_id, "ai", answer, summarize_history)
+            ANSWERS.labels(source).inc()
+            yield f"event: done\ndata: {json.dumps({'answer': answer, 'source': source})}\n\n"
+        except Exception as e:
+            logger.error(f"Q&A stream error: {e}")
+            yield f"event: error\ndata: {json.dumps({'detail': f'Failed to process question: {e}'})}\n\n"
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
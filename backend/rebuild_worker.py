@@ -0,0 +1,124 @@
+import os
+import time
+import logging
+import threading
+from metrics import NOTIFICATION_LAG, REBUILD_QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+# Quiet period: rebuild once no notification arrived for this many seconds.
+# Max delay: never hold a pending rebuild longer than this, even mid-burst.
+REBUILD_QUIET_PERIOD = float(os.getenv("REBUILD_QUIET_PERIOD", "2.0"))
+REBUILD_MAX_DELAY = float(os.getenv("REBUILD_MAX_DELAY", "30.0"))
+
+
+class RebuildWorker:
+    """
+    Debounced work queue in front of the insights rebuild. Every notification
+    is submitted here; a dedicated thread waits for the burst to go quiet (or
+    for the maximum delay to pass) and runs a single rebuild for all of it.
+    """
+
+    def __init__(self, rebuild, quiet_period=REBUILD_QUIET_PERIOD, max_delay=REBUILD_MAX_DELAY):
+        self._rebuild = rebuild
+        self.quiet_period = quiet_period
+        self.max_delay = max_delay
+        self._cond = threading.Condition()
+        self._thread = None
+        self._pending = 0
+        self._pending_full = False
+        self._first_pending_at = None
+        self._last_submit_at = None
+        self.rebuilds = 0
+        self.coalesced = 0
+        self.failures = 0
+        self.running = False
+        self.last_duration = None
+        self.last_lag = None
+        self.last_finished_at = None
+
+    def submit(self, full=False):
+        """
+        Queue a rebuild. full=True also rebuilds the aggregate store from the
+        table before the insights.
+        """
+        with self._cond:
+            now = time.monotonic()
+            if self._pending == 0:
+                self._first_pending_at = now
+            self._pending += 1
+            self._pending_full = self._pending_full or full
+            self._last_submit_at = now
+            self._cond.notify()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="rebuild-worker", daemon=True)
+        self._thread.start()
+        logger.info(f"Rebuild worker started (quiet period {self.quiet_period}s, max delay {self.max_delay}s).")
+
+    def _next_batch(self):
+        with self._cond:
+            while self._pending == 0:
+                self._cond.wait()
+            while True:
+                deadline = min(self._last_submit_at + self.quiet_period,
+                               self._first_pending_at + self.max_delay)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = (self._pending, self._pending_full, self._first_pending_at)
+            self._pending = 0
+            self._pending_full = False
+            self._first_pending_at = None
+            self.running = True
+            return batch
+
+    def _run(self):
+        while True:
+            count, full, first_pending_at = self._next_batch()
+            started = time.monotonic()
+            try:
+                self._rebuild(full)
+                self.rebuilds += 1
+                self.coalesced += count
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"Rebuild failed: {e}")
+            finished = time.monotonic()
+            self.running = False
+            self.last_duration = finished - started
+            self.last_lag = finished - first_pending_at
+            self.last_finished_at = time.time()
+            NOTIFICATION_LAG.observe(self.last_lag)
+            logger.info(f"Rebuild covering {count} notification(s) took {self.last_duration:.2f}s "
+                        f"({self.last_lag:.2f}s after the first one).")
+
+    def stats(self):
+        with self._cond:
+            pending_age = (time.monotonic() - self._first_pending_at) if self._pending else 0.0
+            return {
+                "queue_depth": self._pending,
+                "oldest_pending_seconds": round(pending_age, 3),
+                "running": self.running,
+                "rebuilds": self.rebuilds,
+                "notifications_coalesced": self.coalesced,
+                "failures": self.failures,
+                "last_duration_seconds": self.last_duration,
+                "last_lag_seconds": self.last_lag,
+                "last_finished_at": self.last_finished_at,
+            }
+
+
+def _rebuild(full):
+    if full:
+        from aggregates import rebuild_aggregates
+        rebuild_aggregates()
+    from rag import update_insights
+    update_insights()
+
+
+rebuild_worker = RebuildWorker(_rebuild)
+REBUILD_QUEUE_DEPTH.set_function(lambda: rebuild_worker.stats()["queue_depth"])
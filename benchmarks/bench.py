@@ -0,0 +1,233 @@
+"""
+Benchmarks the backend endpoints and the insights rebuild path against a SQLite
+stand-in for PostgreSQL and deterministic fake Ollama models.
+
+    python benchmarks/bench.py --sizes 5000 80000 1000000 --save-baseline benchmarks/baseline.json
+    python benchmarks/bench.py --sizes 5000 80000 --compare benchmarks/baseline.json
+
+Each scenario reports p50/p95/p99 latency, sequential throughput and the peak
+Python memory allocated by one extra traced run.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+WORKDIR = tempfile.mkdtemp(prefix="hotel-bench-")
+# Always a throwaway SQLite file: seed_table drops hotel_bookings, so an exported
+# DATABASE_URL must never be picked up here
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(WORKDIR, 'bench.db')}"
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+import data_gen
+import aggregates
+import analytics
+import rag
+from answer_cache import answer_cache
+from main import app
+from fakes import FakeEmbeddings, FakeLLM
+
+logger = logging.getLogger("bench")
+
+DATASET = os.path.join(ROOT, "Datasets", "hotel_bookings_cleaned.csv")
+DEFAULT_SIZES = [5000, 80000, 1000000]
+REGRESSION_THRESHOLD = 0.2
+
+
+def configure_fakes(args):
+    rag.build_embeddings = lambda: FakeEmbeddings(call_latency=args.embed_latency,
+                                                  text_latency=args.embed_text_latency)
+    rag.build_llm = lambda: FakeLLM(first_token_latency=args.llm_latency,
+                                    token_latency=args.llm_token_latency)
+    rag.FAISS_INDEX_DIR = os.path.join(WORKDIR, "faiss_index")
+
+
+def reset_state():
+    """Drops every in-process cache so the next run starts cold."""
+    aggregates.aggregate_store.loaded = False
+    rag.vector_store = None
+    rag.qa_chain = None
+    rag.current_insights = {}
+    rag._embeddings = None
+    rag.EMBEDDING_CACHE_DIR = tempfile.mkdtemp(prefix="embedding-cache-", dir=WORKDIR)
+    analytics._chart_cache.clear()
+    answer_cache.__init__()
+
+
+def seed_table(rows):
+    """Fills hotel_bookings with rows bookings: the cleaned dataset first, synthetic rows after it."""
+    with data_gen.engine.begin() as connection:
+        connection.execute(text("DROP TABLE IF EXISTS hotel_bookings"))
+    base = pd.read_csv(DATASET, nrows=rows)
+    base.to_sql("hotel_bookings", data_gen.engine, index=False, chunksize=50000)
+    if rows > len(base):
+        data_gen.bulk_generate(rows - len(base), seed=0, distributions="fitted")
+
+
+def summarize(latencies, peak_bytes):
+    latencies_ms = np.asarray(latencies) * 1000
+    return {
+        "iterations": len(latencies),
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies_ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(latencies_ms, 99)), 3),
+        "throughput_per_s": round(len(latencies) / (latencies_ms.sum() / 1000), 2),
+        "peak_mb": round(peak_bytes / 2 ** 20, 3),
+    }
+
+
+def measure(run, iterations, setup=None):
+    """
+    Times run(i) over the given iterations. setup(i) runs untimed before each
+    call; run may return its own latency (e.g. time to first token).
+    """
+    latencies = []
+    for i in range(iterations):
+        if setup:
+            setup(i)
+        started = time.perf_counter()
+        reported = run(i)
+        latencies.append(reported if isinstance(reported, float) else time.perf_counter() - started)
+    if setup:
+        setup(iterations)
+    tracemalloc.start()
+    run(iterations)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return summarize(latencies, peak)
+
+
+def check(response, *statuses):
+    if response.status_code not in (statuses or (200,)):
+        raise RuntimeError(f"{response.request.method} {response.request.url} -> "
+                           f"{response.status_code}: {response.text[:200]}")
+    return response
+
+
+def run_size(client, rows, args):
+    logger.info(f"Seeding {rows} rows...")
+    seed_table(rows)
+    reset_state()
+    results = {}
+
+    def cold_rebuild_setup(_):
+        reset_state()
+
+    def cold_rebuild(_):
+        aggregates.rebuild_aggregates()
+        rag.update_insights()
+
+    results["rebuild_cold"] = measure(cold_rebuild, args.rebuild_iterations, cold_rebuild_setup)
+    results["aggregate_rebuild"] = measure(lambda _: aggregates.rebuild_aggregates(), args.rebuild_iterations)
+    results["rebuild_incremental"] = measure(
+        lambda _: rag.update_insights(), args.iterations,
+        lambda _: check(client.post("/api/generate-data")))
+
+    results["analytics_render"] = measure(
+        lambda _: check(client.get("/api/analytics")), args.iterations,
+        lambda _: data_gen.bump_data_version())
+    etag = check(client.get("/api/analytics")).headers["etag"]
+    results["analytics_304"] = measure(
+        lambda _: check(client.get("/api/analytics", headers={"If-None-Match": etag}), 304), args.iterations)
+    results["analytics_cube"] = measure(
+        lambda _: check(client.get("/api/analytics/cube", params={
+            "hotel": "City Hotel", "start": "2016-01", "end": "2016-03"})), args.iterations)
+    results["generate_data"] = measure(lambda _: check(client.post("/api/generate-data")), args.iterations)
+
+    results["ask_fast_path"] = measure(
+        lambda _: check(client.post("/api/ask", json={"question": "What was the revenue in July 2016?"})),
+        args.iterations)
+    # The open-ended questions below avoid metric keywords so they reach the RAG chain
+    results["ask_rag"] = measure(
+        lambda i: check(client.post("/api/ask", json={"question": f"Tell me something notable about this data ({i})"})),
+        args.iterations)
+    check(client.post("/api/ask", json={"question": "Give me an overview of the data"}))
+    results["ask_cached"] = measure(
+        lambda _: check(client.post("/api/ask", json={"question": "Give me an overview of the data"})),
+        args.iterations)
+
+    def stream_first_token(i):
+        # TestClient buffers streamed bodies, so drive the endpoint's iterator directly
+        async def first_token_latency():
+            started = time.perf_counter()
+            response = await rag.stream_answer({"question": f"Describe the guest patterns ({i})"})
+            first_token = None
+            async for chunk in response.body_iterator:
+                if first_token is None and chunk.startswith("data:"):
+                    first_token = time.perf_counter() - started
+            return first_token
+        return asyncio.run(first_token_latency())
+
+    results["ask_stream_ttft"] = measure(stream_first_token, args.iterations)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Prints per-metric changes against a saved baseline; returns the number of regressions."""
+    regressions = 0
+    for size, scenarios in results.items():
+        for scenario, metrics in scenarios.items():
+            base = baseline.get(size, {}).get(scenario)
+            if not base:
+                continue
+            for metric in ("p50_ms", "p95_ms", "p99_ms", "peak_mb"):
+                if not base.get(metric):
+                    continue
+                change = (metrics[metric] - base[metric]) / base[metric]
+                flag = "REGRESSION" if change > threshold else ""
+                regressions += bool(flag)
+                print(f"{size:>8} {scenario:<22} {metric:<8} {base[metric]:>10.3f} -> "
+                      f"{metrics[metric]:>10.3f} ({change:+.1%}) {flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the hotel booking backend with local stand-ins.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--rebuild-iterations", type=int, default=3)
+    parser.add_argument("--embed-latency", type=float, default=0.02, help="seconds per embedding call")
+    parser.add_argument("--embed-text-latency", type=float, default=0.002, help="seconds per embedded text")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds to first token")
+    parser.add_argument("--llm-token-latency", type=float, default=0.005, help="seconds per generated token")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--save-baseline", help="save results as the baseline at this path")
+    parser.add_argument("--compare", help="compare results with the baseline at this path")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="relative increase reported as a regression")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    logger.setLevel(logging.INFO)
+
+    configure_fakes(args)
+    client = TestClient(app)
+    results = {}
+    for rows in args.sizes:
+        results[str(rows)] = run_size(client, rows, args)
+        for scenario, metrics in results[str(rows)].items():
+            print(f"{rows:>8} {scenario:<22} p50 {metrics['p50_ms']:>9.2f} ms  p95 {metrics['p95_ms']:>9.2f} ms  "
+                  f"p99 {metrics['p99_ms']:>9.2f} ms  {metrics['throughput_per_s']:>9.1f}/s  "
+                  f"peak {metrics['peak_mb']:>8.2f} MB")
+
+    for path in filter(None, [args.output, args.save_baseline]):
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
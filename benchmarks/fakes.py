@@ -0,0 +1,81 @@
+"""
+Deterministic local stand-ins for the Ollama models, with configurable latency,
+so the backend can be benchmarked without nomic-embed-text or phi4.
+"""
+import asyncio
+import hashlib
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+
+
+class FakeEmbeddings(Embeddings):
+    """Unit vectors seeded from a hash of the text; latency is per call plus per text."""
+
+    def __init__(self, size=768, call_latency=0.0, text_latency=0.0):
+        self.size = size
+        self.call_latency = call_latency
+        self.text_latency = text_latency
+        self.texts_embedded = 0
+
+    def _vector(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.size)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.call_latency + self.text_latency * len(texts))
+        self.texts_embedded += len(texts)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(self.call_latency + self.text_latency * len(texts))
+        self.texts_embedded += len(texts)
+        return [self._vector(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+class FakeLLM(LLM):
+    """Returns a fixed answer after a first-token delay, then one word per token delay."""
+
+    answer: str = "Based on the insights, the figures for that period are shown in the context above."
+    first_token_latency: float = 0.0
+    token_latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-benchmark"
+
+    def _tokens(self):
+        words = self.answer.split(" ")
+        return [word if i == 0 else " " + word for i, word in enumerate(words)]
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> str:
+        time.sleep(self.first_token_latency + self.token_latency * len(self._tokens()))
+        return self.answer
+
+    async def _acall(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> str:
+        await asyncio.sleep(self.first_token_latency + self.token_latency * len(self._tokens()))
+        return self.answer
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None,
+                **kwargs: Any) -> Iterator[GenerationChunk]:
+        time.sleep(self.first_token_latency)
+        for token in self._tokens():
+            time.sleep(self.token_latency)
+            yield GenerationChunk(text=token)
+
+    async def _astream(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None,
+                       **kwargs: Any) -> AsyncIterator[GenerationChunk]:
+        await asyncio.sleep(self.first_token_latency)
+        for token in self._tokens():
+            await asyncio.sleep(self.token_latency)
+            yield GenerationChunk(text=token)
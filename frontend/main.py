@@ -1,7 +1,11 @@
 import streamlit as st
 import requests
+import threading
+import uuid
 import plotly.io as pio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from requests.adapters import HTTPAdapter
 
 # Configure page
 st.set_page_config(page_title="Hotel Booking Assistant", page_icon="🏨", layout="wide")
@@ -9,12 +13,80 @@ st.set_page_config(page_title="Hotel Booking Assistant", page_icon="🏨", layou
 # Initialize session state variables if not already set
 if "chat_history" not in st.session_state:
     st.session_state["chat_history"] = []
-if "charts" not in st.session_state:
-    st.session_state["charts"] = {}
+if "show_charts" not in st.session_state:
+    st.session_state["show_charts"] = False
 if "selected_chart" not in st.session_state:
     st.session_state["selected_chart"] = "All Charts"
+if "session_id" not in st.session_state:
+    st.session_state["session_id"] = uuid.uuid4().hex
 
 API_ENDPOINT = "http://localhost:8000/api"
+# (connect, read) timeouts in seconds; answers from the LLM can take much longer than charts
+REQUEST_TIMEOUT = (3.05, 30)
+ASK_TIMEOUT = (3.05, 300)
+MAX_PARALLEL_FETCHES = 7
+# How often the dashboard checks the backend's data version for changes
+CHART_POLL_SECONDS = 10
+
+# Sidebar title -> backend chart name, in display order
+CHARTS = {
+    "Revenue Trends": "revenue_trend",
+    "Cancellation Rate": "cancellation_rate",
+    "Geographical Distribution": "geographical_dist",
+    "Monthly Booking Trends": "monthly_trends",
+    "Lead Time Trends": "lead_time_dist",
+    "ADR Distribution": "adr_distribution",
+    "Stay Duration": "stay_duration"
+}
+
+@st.cache_resource
+def get_http_session():
+    """Keep-alive HTTP session shared by every rerun and browser session."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_PARALLEL_FETCHES)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+@st.cache_resource
+def figure_store():
+    """
+    Parsed figures shared across reruns: chart name -> (chart ETag, figure,
+    data version it was last checked against).
+    """
+    return {"figures": {}, "lock": threading.Lock()}
+
+def fetch_chart(session, name, etag):
+    """Conditional GET for one chart; runs in a worker thread, so no Streamlit calls here."""
+    headers = {"If-None-Match": etag} if etag else {}
+    response = session.get(f"{API_ENDPOINT}/analytics/charts/{name}", headers=headers, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return response.status_code, response.headers.get("ETag"), response.text
+
+def load_figures(names):
+    """
+    Figures for the given charts at the backend's current data version. Only
+    charts not yet checked against that version are requested, concurrently
+    and conditionally, so unchanged charts are neither downloaded nor re-parsed.
+    """
+    session = get_http_session()
+    response = session.get(f"{API_ENDPOINT}/analytics/charts", timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    version = response.headers.get("ETag")
+    store = figure_store()
+    with store["lock"]:
+        figures = store["figures"]
+        stale = [name for name in names if name not in figures or figures[name][2] != version]
+        if stale:
+            cached_etags = [figures[name][0] if name in figures else None for name in stale]
+            with ThreadPoolExecutor(max_workers=min(len(stale), MAX_PARALLEL_FETCHES)) as pool:
+                results = list(pool.map(lambda args: fetch_chart(session, *args), zip(stale, cached_etags)))
+            for name, (status, etag, body) in zip(stale, results):
+                if status == 304:
+                    figures[name] = (figures[name][0], figures[name][1], version)
+                else:
+                    figures[name] = (etag, pio.from_json(body), version)
+        return {name: figures[name][1] for name in names}
 
 # ---- HEADER ----
 st.title("LLM-Powered Booking Analytics & QA System 🛎️🛋️")
@@ -33,49 +105,42 @@ with st.sidebar:
         key="chart_selector"
     )
     if st.button("✨ Generate Analytics Report"):
-        with st.spinner("Generating analytics..."):
-            try:
-                response = requests.post(f"{API_ENDPOINT}/analytics")
-                if response.status_code == 200:
-                    data = response.json()
-                    st.session_state["charts"] = {
-                        "Revenue Trends": data["revenue_trend"],
-                        "Cancellation Rate": data["cancellation_rate"],
-                        "Geographical Distribution": data["geographical_dist"],
-                        "Monthly Booking Trends": data["monthly_trends"],
-                        "Lead Time Trends": data["lead_time_dist"],
-                        "ADR Distribution": data["adr_distribution"],
-                        "Stay Duration": data["stay_duration"]
-                    }
-                    st.success("Analytics generated successfully!")
-                else:
-                    st.error(f"Error: {response.json().get('error', 'Unknown error')}")
-            except requests.ConnectionError:
-                st.error("Backend service unavailable. Please check server status.")
+        # Charts are then fetched on demand and kept current by the dashboard below
+        st.session_state["show_charts"] = True
     
     st.subheader("🛠️ Data Generation")
     if st.button("🔥 Create New Booking Record"):
         with st.spinner("Generating new record..."):
             try:
-                response = requests.post(f"{API_ENDPOINT}/generate-data")
+                response = get_http_session().post(f"{API_ENDPOINT}/generate-data", timeout=REQUEST_TIMEOUT)
                 if response.status_code == 200:
                     st.success(response.json().get("message", "New data generated"))
                 else:
                     st.error(f"Error: {response.json().get('error', 'Unknown error')}")
-            except requests.ConnectionError:
+            except requests.RequestException:
                 st.error("Backend service unavailable. Please check server status.")
 
 # ---- DASHBOARD SECTION ----
-if st.session_state["charts"]:
+@st.fragment(run_every=CHART_POLL_SECONDS)
+def dashboard():
+    """Reruns on its own every CHART_POLL_SECONDS; unchanged charts cost one small version request."""
+    if not st.session_state["show_charts"]:
+        return
     selected = st.session_state["selected_chart"]
+    titles = list(CHARTS) if selected == "All Charts" else [selected]
+    try:
+        figures = load_figures([CHARTS[title] for title in titles])
+    except requests.RequestException as e:
+        st.error(f"Could not load analytics: {e}")
+        return
     if selected == "All Charts":
-        for chart_title, chart_json in st.session_state["charts"].items():
+        for chart_title in titles:
             with st.expander(chart_title, expanded=True):
-                st.plotly_chart(pio.from_json(chart_json), use_container_width=True)
+                st.plotly_chart(figures[CHARTS[chart_title]], use_container_width=True)
     else:
-        chart_json = st.session_state["charts"].get(selected)
-        if chart_json:
-            st.plotly_chart(pio.from_json(chart_json), use_container_width=True)
+        st.plotly_chart(figures[CHARTS[selected]], use_container_width=True)
+
+dashboard()
 
 # ---- CHAT SECTION ----
 chat_container = st.container()
@@ -88,7 +153,8 @@ if user_input:
     st.session_state["chat_history"].append({"role": "user", "content": user_input})
     st.chat_message("user").write(user_input)
     try:
-        response = requests.post(f"{API_ENDPOINT}/ask", json={"question": user_input})
+        response = get_http_session().post(f"{API_ENDPOINT}/ask", json={"question": user_input, "session_id": st.session_state["session_id"]},
+                                           timeout=ASK_TIMEOUT)
         if response.status_code == 200:
             answer = response.json().get("answer", "No answer received")
             st.session_state["chat_history"].append({"role": "assistant", "content": answer})
@@ -96,5 +162,5 @@ if user_input:
         else:
             error_msg = f"API Error: {response.json().get('error', 'Unknown error')}"
             st.chat_message("assistant").write(error_msg)
-    except requests.ConnectionError:
+    except requests.RequestException:
         st.chat_message("assistant").write("Backend service unavailable. Please check server status.")
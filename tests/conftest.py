@@ -0,0 +1,53 @@
+"""
+Runs the backend against a SQLite copy of the cleaned dataset and the fake
+models from benchmarks/fakes.py, so no PostgreSQL or Ollama is needed.
+"""
+import os
+import sys
+import tempfile
+
+WORKDIR = tempfile.mkdtemp(prefix="hotel-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(WORKDIR, 'tests.db')}"
+os.environ["LEADER_LOCK_FILE"] = os.path.join(WORKDIR, "leader.lock")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+DATASET = os.path.join(ROOT, "Datasets", "hotel_bookings_cleaned.csv")
+SAMPLE_ROWS = 5000
+
+
+@pytest.fixture(scope="session")
+def app_client():
+    import aggregates
+    import db
+    import rag
+    from fakes import FakeEmbeddings, FakeLLM
+    from main import app
+
+    rag.build_embeddings = lambda: FakeEmbeddings()
+    rag.build_llm = lambda: FakeLLM()
+    rag.FAISS_INDEX_DIR = os.path.join(WORKDIR, "faiss_index")
+    rag.EMBEDDING_CACHE_DIR = os.path.join(WORKDIR, "embedding_cache")
+    with db.engine.begin() as connection:
+        connection.execute(text("DROP TABLE IF EXISTS hotel_bookings"))
+    pd.read_csv(DATASET, nrows=SAMPLE_ROWS).to_sql("hotel_bookings", db.engine, index=False)
+    aggregates.rebuild_aggregates()
+    rag.update_insights()
+    # No lifespan: startup would start the PostgreSQL notification listener
+    return TestClient(app)
+
+
+@pytest.fixture
+def fresh_answer_cache(monkeypatch):
+    import rag
+    from answer_cache import AnswerCache
+
+    cache = AnswerCache()
+    monkeypatch.setattr(rag, "answer_cache", cache)
+    return cache
@@ -0,0 +1,84 @@
+import json
+
+import pytest
+from sqlalchemy import text
+
+from aggregates import AggregateStore, MONTH_NUMBER
+from data_gen import bump_data_version
+
+RECORDS = [
+    {"hotel": "City Hotel", "is_canceled": 0, "lead_time": 10, "arrival_date_year": 2016,
+     "arrival_date_month": "July", "adr": 120.5, "stays_in_week_nights": 2,
+     "stays_in_weekend_nights": 1, "country": "PRT"},
+    {"hotel": "Resort Hotel", "is_canceled": 1, "lead_time": 40, "arrival_date_year": 2015,
+     "arrival_date_month": "August", "adr": 80.0, "stays_in_week_nights": 1,
+     "stays_in_weekend_nights": 2, "country": "GBR"},
+]
+
+
+def test_content_hash_ignores_insertion_order_and_survives_snapshots():
+    first, second, restored = AggregateStore(), AggregateStore(), AggregateStore()
+    for record in RECORDS:
+        first.add_booking(record)
+    for record in reversed(RECORDS):
+        second.add_booking(record)
+    restored.restore(first.snapshot())
+    assert first.content_hash() == second.content_hash() == restored.content_hash()
+    second.add_booking(RECORDS[0])
+    assert first.content_hash() != second.content_hash()
+
+
+def test_chart_version_only_changes_with_the_data(app_client):
+    before = app_client.get("/api/analytics/charts")
+    bump_data_version()  # another worker's counter would differ too
+    after = app_client.get("/api/analytics/charts")
+    assert before.headers["ETag"] == after.headers["ETag"]
+    assert json.loads(before.text)["version"] == json.loads(after.text)["version"]
+    response = app_client.get("/api/analytics", headers={"If-None-Match": before.headers["ETag"]})
+    assert response.status_code == 304
+
+
+def test_chart_is_rendered_and_revalidated(app_client):
+    response = app_client.get("/api/analytics/charts/revenue_trend")
+    assert response.status_code == 200
+    assert "data" in response.json()
+    cached = app_client.get("/api/analytics/charts/revenue_trend",
+                            headers={"If-None-Match": response.headers["ETag"]})
+    assert cached.status_code == 304
+
+
+def test_cube_quarter_slice_matches_group_by(app_client):
+    import db
+
+    response = app_client.get("/api/analytics/cube",
+                              params={"hotel": "Resort Hotel", "start": "2016-04", "end": "2016-06"})
+    assert response.status_code == 200
+    monthly = {(row["year"], row["month"]): row for row in response.json()["monthly"]}
+    with db.engine.connect() as connection:
+        expected = connection.execute(text(
+            "SELECT arrival_date_month, COUNT(*) AS bookings, SUM(is_canceled) AS cancellations, "
+            "SUM(revenue) AS revenue FROM hotel_bookings "
+            "WHERE hotel = 'Resort Hotel' AND arrival_date_year = 2016 "
+            "AND arrival_date_month IN ('April', 'May', 'June') GROUP BY arrival_date_month")).all()
+    assert expected
+    assert sorted(monthly) == sorted((2016, MONTH_NUMBER[row.arrival_date_month]) for row in expected)
+    for row in expected:
+        cube_row = monthly[(2016, MONTH_NUMBER[row.arrival_date_month])]
+        assert cube_row["bookings"] == row.bookings
+        assert cube_row["cancellations"] == row.cancellations
+        assert cube_row["revenue"] == pytest.approx(row.revenue)
+    assert [hotel["hotel"] for hotel in response.json()["hotels"]] == ["Resort Hotel"]
+
+
+def test_cube_country_filter(app_client):
+    response = app_client.get("/api/analytics/cube", params={"country": "PRT"})
+    assert response.status_code == 200
+    body = response.json()
+    assert [row["country"] for row in body["countries"]] == ["PRT"]
+    assert sum(row["bookings"] for row in body["monthly"]) == body["countries"][0]["bookings"]
+
+
+@pytest.mark.parametrize("period", ["2016", "2016-13", "July 2016", "2016-xx"])
+def test_cube_rejects_malformed_periods(app_client, period):
+    response = app_client.get("/api/analytics/cube", params={"start": period})
+    assert response.status_code == 422
@@ -0,0 +1,62 @@
+import json
+import uuid
+
+
+def ask(client, question, session_id):
+    response = client.post("/api/ask", json={"question": question, "session_id": session_id})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def stream_events(client, question, session_id):
+    response = client.post("/api/ask/stream", json={"question": question, "session_id": session_id})
+    assert response.status_code == 200, response.text
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        lines = block.split("\n")
+        event = lines[0][len("event: "):] if lines[0].startswith("event: ") else "message"
+        events.append((event, json.loads(lines[-1][len("data: "):])))
+    return events
+
+
+def test_ask_follow_up_in_session_uses_rag(app_client, fresh_answer_cache):
+    session_id = uuid.uuid4().hex
+    first = ask(app_client, "Tell me something notable about the guests", session_id)
+    second = ask(app_client, "And how does that compare with the resort?", session_id)
+    assert first["source"] == "rag"
+    assert second["source"] == "rag"
+    assert second["answer"]
+
+
+def test_stream_follow_up_in_session_streams_tokens(app_client, fresh_answer_cache):
+    session_id = uuid.uuid4().hex
+    for question in ("Describe the guest patterns", "What about the weekends?"):
+        events = stream_events(app_client, question, session_id)
+        tokens = [data["token"] for event, data in events if event == "message"]
+        event, done = events[-1]
+        assert event == "done", events
+        assert done["source"] == "rag"
+        assert "".join(tokens) == done["answer"]
+
+
+def test_follow_ups_share_the_cache_through_their_standalone_question(app_client, fresh_answer_cache):
+    # the fake LLM rephrases every follow-up to the same standalone question
+    first, second = uuid.uuid4().hex, uuid.uuid4().hex
+    ask(app_client, "Tell me about the guests", first)
+    ask(app_client, "Describe the bookings", second)
+    assert ask(app_client, "What about the weekends?", first)["source"] == "rag"
+    assert ask(app_client, "And on weekdays?", second)["source"] == "cache"
+    events = stream_events(app_client, "And in winter?", first)
+    assert events[-1][1]["source"] == "cache"
+
+
+def test_fast_path_turns_are_summarized_when_trimmed(app_client, monkeypatch):
+    import rag
+    from memory import SessionMemory
+
+    memory = SessionMemory(token_budget=40, summarize=True)
+    monkeypatch.setattr(rag, "session_memory", memory)
+    session_id = uuid.uuid4().hex
+    for _ in range(3):
+        assert ask(app_client, "What was the total revenue in July 2016?", session_id)["source"] == "fast_path"
+    assert memory.history_text(session_id).startswith("summary: ")
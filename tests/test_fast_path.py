@@ -0,0 +1,45 @@
+import pytest
+# The test table holds the first 5000 rows of the dataset: Resort Hotel, 2015-2016
+from fast_path import answer_from_aggregates
+
+ROUTED = [
+    ("What was the revenue in July 2016?", "Total revenue in July 2016 was"),
+    ("What is the cancellation rate for the resort hotel in 2016?", "The cancellation rate for Resort Hotel in 2016"),
+    ("What is the average lead time at the resort hotel?", "The average booking lead time for Resort Hotel"),
+    ("How many bookings were there in August 2015?", "bookings in August 2015"),
+    ("What is the ADR for the resort hotel?", "The mean ADR for Resort Hotel"),
+    ("What are the top countries by bookings?", "The top countries by booking count"),
+    ("Which countries do most guests come from?", "The top countries by booking count"),
+]
+
+FALL_THROUGH = [
+    "How many bookings came from PRT?",
+    "What is the cancellation rate for guests from GBR?",
+    "How many bookings from Portugal were there in 2016?",
+    "Which hotel has the highest ADR?",
+    "What was the highest revenue month?",
+    "Which month had the most bookings?",
+    "Revenue in Q3 2016?",
+    "What was the revenue in the first half of 2016?",
+    "What was the revenue last year?",
+    "How many bookings since 2016?",
+    "What is the cancellation rate per month?",
+    "Why did cancellations rise in 2016?",
+]
+
+
+@pytest.mark.parametrize("question,expected", ROUTED)
+def test_routes_questions_the_fact_table_answers(app_client, question, expected):
+    answer = answer_from_aggregates(question)
+    assert answer is not None and expected in answer
+
+
+@pytest.mark.parametrize("question", FALL_THROUGH)
+def test_unsupported_dimensions_fall_through_to_rag(app_client, question):
+    assert answer_from_aggregates(question) is None
+
+
+def test_fall_through_reaches_rag_endpoint(app_client):
+    response = app_client.post("/api/ask", json={"question": "How many bookings came from PRT?"})
+    assert response.status_code == 200
+    assert response.json()["source"] in ("rag", "cache")
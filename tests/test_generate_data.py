@@ -0,0 +1,56 @@
+import pytest
+
+
+@pytest.mark.parametrize("body", [
+    {"rows": "abc"},
+    {"rows": None},
+    {"rows": 0},
+    {"rows": 10, "chunk_size": 0},
+    {"rows": 10, "chunk_size": -5},
+    {"rows": 10, "chunk_size": "big"},
+])
+def test_bulk_rejects_invalid_sizes(app_client, body):
+    response = app_client.post("/api/generate-data/bulk", json=body)
+    assert response.status_code == 422
+
+
+def test_bulk_inserts_in_chunks(app_client):
+    response = app_client.post("/api/generate-data/bulk",
+                               json={"rows": 25, "chunk_size": 10, "seed": 1, "distributions": "default"})
+    assert response.status_code == 200
+    assert response.json()["rows"] == 25
+
+
+def test_bulk_leaves_rows_to_listener_when_triggers_fire(app_client, monkeypatch):
+    import aggregates
+    import data_gen
+    from aggregates import aggregate_store
+
+    monkeypatch.setattr(data_gen, "suppress_row_triggers", lambda connection: False)
+    before = sum(cell.bookings for _, cell in aggregate_store.cells())
+    data_gen.bulk_generate(5, seed=2, distributions="default", chunk_size=5)
+    assert sum(cell.bookings for _, cell in aggregate_store.cells()) == before
+    aggregates.rebuild_aggregates()  # what the listener's rebuild would do, for the tests that follow
+
+
+@pytest.mark.parametrize("body", [
+    {"rows": 10, "distributions": {"adr": {"foo": 1}}},
+    {"rows": 10, "distributions": {"adr": {"min": 300, "max": 50}}},
+    {"rows": 10, "distributions": {"hotel": {"min": 1, "max": 2}}},
+    {"rows": 10, "distributions": {"country": {"values": ["PRT"], "weights": [1, 2]}}},
+    {"rows": 10, "distributions": {"arrival_date_month": {"values": ["Juli"]}}},
+    {"rows": 10, "distributions": {"lead_time": {"quantiles": [5]}}},
+    {"rows": 10, "distributions": {"room": {"values": ["A"]}}},
+    {"rows": 10, "distributions": "uniform"},
+    {"rows": 10, "seed": "x"},
+    {"rows": 10, "seed": -1},
+])
+def test_bulk_rejects_malformed_specs(app_client, body):
+    response = app_client.post("/api/generate-data/bulk", json=body)
+    assert response.status_code == 422, response.text
+
+
+def test_bulk_accepts_partial_overrides(app_client):
+    response = app_client.post("/api/generate-data/bulk",
+                               json={"rows": 5, "seed": 3, "distributions": {"adr": {"min": 60, "max": 70}}})
+    assert response.status_code == 200, response.text
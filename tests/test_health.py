@@ -0,0 +1,13 @@
+import uuid
+
+
+def test_session_memory_is_reported(app_client):
+    session_id = uuid.uuid4().hex
+    app_client.post("/api/ask", json={"question": "What was the total revenue in July 2016?",
+                                      "session_id": session_id})
+    sessions = app_client.get("/api/health").json()["sessions"]
+    assert sessions["sessions"] >= 1
+    assert sessions["history_tokens"] > 0
+    metrics = app_client.get("/api/metrics").text
+    assert "hotel_sessions " in metrics
+    assert "hotel_session_history_tokens " in metrics
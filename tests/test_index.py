@@ -0,0 +1,19 @@
+import rag
+
+
+def test_published_index_can_be_updated_after_loading(app_client, monkeypatch):
+    assert rag.load_published_index()
+    insights = dict(rag.current_insights)
+    ntotal = rag.vector_store.index.ntotal
+    version = rag.insights_version
+    monkeypatch.setattr(rag, "compute_insights", lambda: {**insights, "extra:1": "An extra insight."})
+    rag.update_insights()
+    assert rag.insights_version == version + 1
+    assert rag.vector_store.index.ntotal == ntotal + 1
+
+
+def test_unchanged_data_is_not_republished(app_client):
+    rag.update_insights()
+    version = rag.read_current_index()[0]
+    rag.update_insights()
+    assert rag.read_current_index()[0] == version
@@ -0,0 +1,68 @@
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, text
+
+import ingest
+from conftest import DATASET
+from data_gen import BOOKING_COLUMNS
+
+ROWS = 450
+CHUNK_SIZE = 100
+
+
+@pytest.fixture
+def source(tmp_path, monkeypatch):
+    """A CSV with some revenue gaps and two invalid rows, loaded into its own SQLite database."""
+    monkeypatch.setattr(ingest, "engine", create_engine(f"sqlite:///{tmp_path / 'ingest.db'}"))
+    df = pd.read_csv(DATASET, nrows=ROWS)[BOOKING_COLUMNS]
+    df.loc[::7, "revenue"] = None
+    df.loc[[10, 320], "arrival_date_month"] = "Smarch"
+    path = tmp_path / "bookings.csv"
+    df.to_csv(path, index=False)
+    return path, df
+
+
+def table(engine):
+    with engine.connect() as connection:
+        return pd.read_sql(text("SELECT * FROM hotel_bookings"), connection)
+
+
+def sort_rows(df):
+    return df[BOOKING_COLUMNS].sort_values(BOOKING_COLUMNS).reset_index(drop=True)
+
+
+def test_interrupted_ingest_resumes_without_duplicates_or_gaps(source, monkeypatch):
+    path, df = source
+    insert = ingest.insert_bookings
+    calls = []
+
+    def failing_insert(connection, chunk):
+        calls.append(len(chunk))
+        if len(calls) == 3:
+            raise RuntimeError("connection lost")
+        insert(connection, chunk)
+
+    monkeypatch.setattr(ingest, "insert_bookings", failing_insert)
+    with pytest.raises(RuntimeError):
+        ingest.ingest_csv(str(path), chunk_size=CHUNK_SIZE)
+    partial = table(ingest.engine)
+    assert len(partial) == 2 * CHUNK_SIZE - 1  # one invalid row in the first chunk
+
+    monkeypatch.setattr(ingest, "insert_bookings", insert)
+    result = ingest.ingest_csv(str(path), chunk_size=CHUNK_SIZE)
+    assert result["rows_rejected"] == 1
+
+    loaded = table(ingest.engine)
+    expected = df[df["arrival_date_month"] != "Smarch"].copy()
+    expected["revenue"] = expected["revenue"].fillna(
+        expected["adr"] * (expected["stays_in_week_nights"] + expected["stays_in_weekend_nights"]))
+    assert len(loaded) == ROWS - 2
+    assert loaded["revenue"].notna().all()
+    pd.testing.assert_frame_equal(sort_rows(loaded), sort_rows(expected), check_dtype=False)
+
+
+def test_completed_ingest_is_not_loaded_twice(source):
+    path, _ = source
+    ingest.ingest_csv(str(path), chunk_size=CHUNK_SIZE)
+    assert ingest.ingest_csv(str(path), chunk_size=CHUNK_SIZE)["rows_loaded"] == 0
+    assert len(table(ingest.engine)) == ROWS - 2